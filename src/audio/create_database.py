@@ -1,183 +1,335 @@
 import sqlite3
 import os
-from datetime import datetime
+import json
+import sys
+import atexit
+import threading
+from datetime import date, datetime
 
 # Get the absolute path to the database
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE_PATH = os.path.join(SCRIPT_DIR, 'medical_records.db')
 
+# Connection tuning applied to every connection: WAL journaling with NORMAL sync
+# drops the per-commit fsyncs, and the larger page cache keeps patient rows in RAM
+CONNECTION_PRAGMAS = '''
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA busy_timeout=5000;
+PRAGMA cache_size=-20000;
+PRAGMA temp_store=MEMORY;
+PRAGMA mmap_size=268435456;
+'''
+
+# Age in whole years computed from date_of_birth, shared by the patient views
+AGE_EXPRESSION = '''CASE 
+            WHEN date_of_birth IS NOT NULL THEN
+                CAST(strftime('%Y', 'now') AS INTEGER) - CAST(strftime('%Y', date_of_birth) AS INTEGER)
+                    - (strftime('%m-%d', 'now') < strftime('%m-%d', date_of_birth))
+            ELSE NULL
+        END'''
+
+# Tables and triggers, all created with IF NOT EXISTS so the script is safe to rerun
+SCHEMA_DDL = '''
+CREATE TABLE IF NOT EXISTS patient_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    first_name TEXT,
+    last_name TEXT,
+    date_of_birth DATE,
+    gender TEXT,
+    symptoms TEXT,
+    vital_signs TEXT,
+    medications TEXT,
+    allergies TEXT,
+    medical_history TEXT,
+    family_history TEXT,
+    diagnosis TEXT,
+    treatment_plan TEXT,
+    follow_up_date DATE,
+    notes TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Transcription and analysis files written for each patient
+CREATE TABLE IF NOT EXISTS output_files (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id INTEGER,
+    filename TEXT,
+    file_type TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (patient_id) REFERENCES patient_records (id)
+);
+
+-- Serves the web app's newest-first list of a patient's output files
+CREATE INDEX IF NOT EXISTS ix_output_files_patient_created
+ON output_files (patient_id, created_at DESC);
+
+-- Each recording's transcript with its analysis, as the web app's transcript history reads them
+CREATE TABLE IF NOT EXISTS transcripts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id INTEGER,
+    transcript TEXT,
+    analysis TEXT,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (patient_id) REFERENCES patient_records (id)
+);
+
+-- Serves the newest-first transcript lookups by patient
+CREATE INDEX IF NOT EXISTS ix_transcripts_patient_ts
+ON transcripts (patient_id, timestamp DESC);
+
+-- Keep updated_at current on every change
+CREATE TRIGGER IF NOT EXISTS update_patient_timestamp 
+AFTER UPDATE ON patient_records
+BEGIN
+    UPDATE patient_records SET updated_at = CURRENT_TIMESTAMP
+    WHERE id = NEW.id;
+END;
+'''
+
+# View definitions keyed by name, written exactly as SQLite stores them in sqlite_master
+PATIENT_VIEWS = {
+    # Patient records with calculated age
+    'patient_records_with_age': f'''CREATE VIEW patient_records_with_age AS
+    SELECT 
+        *,
+        {AGE_EXPRESSION} as age
+    FROM patient_records''',
+    # Narrow view with only the columns needed to list patients
+    'patient_summary': f'''CREATE VIEW patient_summary AS
+    SELECT 
+        id, first_name, last_name, gender,
+        {AGE_EXPRESSION} as age
+    FROM patient_records''',
+}
+
+# Queries run on every transcription, kept as constants so the driver's statement cache reuses them
+SQL_GET_PATIENT = 'SELECT * FROM patient_records_with_age WHERE id = ?'
+SQL_ALL_RECORDS = 'SELECT * FROM patient_records_with_age'
+SQL_LIST_PATIENTS = 'SELECT id, first_name, last_name, age, gender FROM patient_summary'
+SQL_GET_PATIENT_NAME = 'SELECT first_name, last_name FROM patient_records WHERE id = ?'
+SQL_ADD_OUTPUT_FILE = 'INSERT INTO output_files (patient_id, filename, file_type) VALUES (?, ?, ?)'
+SQL_ADD_TRANSCRIPT = 'INSERT INTO transcripts (patient_id, transcript, analysis) VALUES (?, ?, ?)'
+
+# Patient columns that can be written by inserts and updates
+PATIENT_COLUMNS = (
+    'first_name', 'last_name', 'date_of_birth', 'gender',
+    'symptoms', 'vital_signs', 'medications', 'allergies',
+    'medical_history', 'family_history', 'diagnosis',
+    'treatment_plan', 'follow_up_date', 'notes'
+)
+
+# Fields that should never be updated from transcripts
+PROTECTED_FIELDS = frozenset({'id', 'first_name', 'last_name', 'date_of_birth', 'gender', 'created_at', 'updated_at'})
+UPDATABLE_FIELDS = frozenset(PATIENT_COLUMNS) - PROTECTED_FIELDS
+
+# Test patients inserted into an empty database
+SEED_PATIENTS = [
+    (
+        'John', 'Doe', '1979-01-15', 'Male',
+        'Headache, Fever', 'BP 120/80, Temp 38.5°C', 'Aspirin',
+        'Penicillin', 'Hypertension', 'Father: Heart Disease',
+        'Common Cold', 'Rest and fluids', '2024-02-15',
+        'Patient reports feeling better'
+    ),
+]
+
+# Single connection shared by every function in this module, opened on first use; every
+# read and write takes _LOCK, since a transaction on the connection is shared by all threads
+_CONN = None
+_LOCK = threading.RLock()
+
+def _get_conn():
+    """Return the shared database connection, opening it on first use."""
+    global _CONN
+    with _LOCK:
+        if _CONN is None:
+            _CONN = sqlite3.connect(DATABASE_PATH, isolation_level=None, check_same_thread=False,
+                                    cached_statements=256)
+            _CONN.executescript(CONNECTION_PRAGMAS)
+            _CONN.row_factory = sqlite3.Row
+        return _CONN
+
+atexit.register(lambda: _CONN and _CONN.close())
+
 def calculate_age(date_of_birth):
     """Calculate age from date of birth."""
     if not date_of_birth:
         return None
     try:
-        dob = datetime.strptime(date_of_birth, '%Y-%m-%d')
-        today = datetime.now()
+        # fromisoformat parses the fixed YYYY-MM-DD format in C, far cheaper than strptime
+        dob = date.fromisoformat(date_of_birth)
+        today = date.today()
         age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
         return age
     except (ValueError, TypeError):
         return None
 
+def _seed(conn, patients: list):
+    """
+    Insert seed patient records if the patients table is empty.
+    
+    Args:
+        conn: Open database connection
+        patients: List of tuples, one value per column in PATIENT_COLUMNS
+    """
+    row_placeholders = f"({', '.join('?' for _ in PATIENT_COLUMNS)})"
+    params = [value for patient in patients for value in patient]
+    with _LOCK:
+        # One atomic statement; NOT EXISTS stops at the first row instead of counting the table
+        conn.execute(
+            f"INSERT INTO patient_records ({', '.join(PATIENT_COLUMNS)}) "
+            f"SELECT * FROM (VALUES {', '.join(row_placeholders for _ in patients)}) "
+            "WHERE NOT EXISTS (SELECT 1 FROM patient_records LIMIT 1)",
+            params
+        )
+
 def create_database():
     """Create the SQLite database with all necessary tables."""
     
     # Connect to SQLite database (creates it if it doesn't exist)
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
-    # Create the patients table if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS patient_records (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        first_name TEXT,
-        last_name TEXT,
-        date_of_birth DATE,
-        gender TEXT,
-        symptoms TEXT,
-        vital_signs TEXT,
-        medications TEXT,
-        allergies TEXT,
-        medical_history TEXT,
-        family_history TEXT,
-        diagnosis TEXT,
-        treatment_plan TEXT,
-        follow_up_date DATE,
-        notes TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create a view for patient records that includes calculated age
-    cursor.execute('''
-    DROP VIEW IF EXISTS patient_records_with_age;
-    ''')
+    conn = _get_conn()
     
-    cursor.execute('''
-    CREATE VIEW patient_records_with_age AS
-    SELECT 
-        *,
-        CASE 
-            WHEN date_of_birth IS NOT NULL THEN
-                (CAST(strftime('%Y.%m%d', 'now') - strftime('%Y.%m%d', date_of_birth) AS INTEGER))
-            ELSE NULL
-        END as age
-    FROM patient_records;
-    ''')
+    with _LOCK:
+        # Views are only dropped and recreated when their stored definition has changed
+        existing_views = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'view'").fetchall())
+        view_ddl = ''.join(
+            f"DROP VIEW IF EXISTS {name};\n{sql};\n"
+            for name, sql in PATIENT_VIEWS.items()
+            if existing_views.get(name) != sql
+        )
+        
+        # Run all of the DDL as one script inside a single transaction
+        conn.executescript(f"BEGIN;\n{SCHEMA_DDL}\n{view_ddl}COMMIT;")
     
-    # Create a trigger to update the updated_at timestamp
-    cursor.execute('''
-    CREATE TRIGGER IF NOT EXISTS update_patient_timestamp 
-    AFTER UPDATE ON patient_records
-    BEGIN
-        UPDATE patient_records SET updated_at = CURRENT_TIMESTAMP
-        WHERE id = NEW.id;
-    END;
-    ''')
+    # Add the test patients to an empty database
+    _seed(conn, SEED_PATIENTS)
+
+def _merge_csv(current: str, new: str) -> tuple:
+    """
+    Merge two comma-separated lists, ignoring case when comparing items.
     
-    # Check if we need to add a test patient
-    cursor.execute("SELECT COUNT(*) FROM patient_records")
-    count = cursor.fetchone()[0]
+    Args:
+        current: The existing comma-separated value
+        new: The comma-separated value to merge in
+        
+    Returns:
+        Tuple of (merged value sorted case-insensitively, set of lowercase items
+        that were not already present). Casing from the new value wins.
+    """
+    current_map = {}
+    for item in str(current or '').split(','):
+        item = item.strip()
+        if item and item.lower() != 'none':
+            current_map.setdefault(item.lower(), item)
     
-    if count == 0:
-        # Add a test patient
-        cursor.execute('''
-        INSERT INTO patient_records (
-            first_name, last_name, date_of_birth, gender,
-            symptoms, vital_signs, medications, allergies,
-            medical_history, family_history, diagnosis,
-            treatment_plan, follow_up_date, notes
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            'John', 'Doe', '1979-01-15', 'Male',
-            'Headache, Fever', 'BP 120/80, Temp 38.5°C', 'Aspirin',
-            'Penicillin', 'Hypertension', 'Father: Heart Disease',
-            'Common Cold', 'Rest and fluids', '2024-02-15',
-            'Patient reports feeling better'
-        ))
+    new_map = {}
+    for item in str(new).split(','):
+        item = item.strip()
+        if item:
+            new_map.setdefault(item.lower(), item)
     
-    # Commit the changes and close the connection
-    conn.commit()
-    conn.close()
+    added = new_map.keys() - current_map.keys()
+    merged = {**current_map, **new_map}
+    return ', '.join(merged[key] for key in sorted(merged)), added
 
-def update_record(patient_id: int, data: dict):
+def _prepare_update(cursor, patient_id: int, data: dict):
     """
-    Update an existing patient record in the database.
-    Appends new data to existing fields without duplicating information.
+    Merge new transcript data into the current patient record.
     
     Args:
+        cursor: Cursor inside the open update transaction
         patient_id: ID of the patient to update
-        data: Dictionary containing the updated patient record data
-    """
-    # If all values are None, don't update
-    if not any(value is not None for value in data.values()):
-        print("No data to update (all values are null)")
-        return
+        data: Dictionary of updatable, non-null fields to merge in
         
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
-    # Check if patient exists
-    cursor.execute('SELECT * FROM patient_records WHERE id = ?', (patient_id,))
-    current_record = cursor.fetchone()
-    if not current_record:
-        print(f"No patient found with ID {patient_id}")
-        conn.close()
-        return
-    
-    # Convert current record to dictionary
-    columns = [description[0] for description in cursor.description]
-    current_data = dict(zip(columns, current_record))
-    
-    # List of fields that should never be updated from transcripts
-    protected_fields = ['id', 'first_name', 'last_name', 'date_of_birth', 'gender', 'created_at', 'updated_at']
+    Returns:
+        Tuple of (updated values, newly added items per merged field),
+        or None if the patient doesn't exist
+    """
+    # Only the comma-list fields being merged need their current values (notes are appended in SQL)
+    merge_fields = [key for key in data if key != 'notes']
+    current_data = {}
+    if merge_fields:
+        cursor.execute(f"SELECT {', '.join(merge_fields)} FROM patient_records WHERE id = ?", (patient_id,))
+        current_record = cursor.fetchone()
+        if not current_record:
+            return None
+        current_data = dict(zip(merge_fields, current_record))
     
-    # Filter out protected fields and prepare updates
+    # Prepare updates for the merged fields
     update_data = {}
-    for key, new_value in data.items():
-        if key in protected_fields or new_value is None:
-            continue
-            
+    added_items = {}
+    for key in merge_fields:
+        new_value = data[key]
         current_value = current_data.get(key)
         if current_value in [None, "None", ""]:  # Handle empty or None values
             # If current value is empty/None, just use the new value
             update_data[key] = new_value
-        elif key != 'notes':  # Notes are handled separately
-            # Split both current and new values into individual items
-            current_items = {item.strip().lower() for item in str(current_value).split(',') if item.strip() and item.strip().lower() != 'none'}
-            new_items = {item.strip().lower() for item in str(new_value).split(',') if item.strip()}
-            
-            # Only add items that don't exist (case-insensitive comparison)
-            new_unique_items = new_items - current_items
-            
+        else:
+            merged_value, new_unique_items = _merge_csv(current_value, new_value)
             if new_unique_items:  # Only update if there are new unique items
-                # Combine existing items with new unique items
-                all_items = current_items | new_unique_items
-                # Convert back to original case using the new values where possible
-                final_items = []
-                for item in sorted(all_items):
-                    # Try to find original case from new values first, then use lowercase if not found
-                    original_case = next((x.strip() for x in str(new_value).split(',') if x.strip().lower() == item), 
-                                      next((x.strip() for x in str(current_value).split(',') if x.strip().lower() == item),
-                                           item))
-                    final_items.append(original_case)
-                update_data[key] = ', '.join(final_items)
+                update_data[key] = merged_value
+                added_items[key] = new_unique_items
     
-    # Handle notes separately - always append with timestamp
+    # Build the SET clause; notes are appended inside SQL so the old text is never read back
+    assignments = [f'{k} = ?' for k in update_data.keys()]
+    params = list(update_data.values())
     if data.get('notes'):
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        current_notes = current_data.get('notes')
-        if current_notes in [None, "None", ""]:
-            new_notes = f"[{timestamp}]\n{data['notes']}"
-        else:
-            new_notes = f"{current_notes}\n\n[{timestamp}]\n{data['notes']}"
-        update_data['notes'] = new_notes
+        entry = f"[{timestamp}]\n{data['notes']}"
+        assignments.append("notes = CASE WHEN notes IS NULL OR notes IN ('None', '') THEN ? ELSE notes || ? END")
+        params += [entry, f"\n\n{entry}"]
+    
+    if assignments:
+        # Update and read back the merged values in a single statement
+        columns = list(update_data.keys()) + (['notes'] if data.get('notes') else [])
+        update_query = ('UPDATE patient_records SET ' + ', '.join(assignments) +
+                        ' WHERE id = ? RETURNING ' + ', '.join(columns))
+        cursor.execute(update_query, params + [patient_id])
+        updated_record = cursor.fetchone()
+        if not updated_record:
+            return None
+        update_data = dict(zip(columns, updated_record))
+    
+    return update_data, added_items
+
+def update_record(patient_id: int, data: dict, verbose: bool = False):
+    """
+    Update an existing patient record in the database.
+    Appends new data to existing fields without duplicating information.
+    
+    Args:
+        patient_id: ID of the patient to update
+        data: Dictionary containing the updated patient record data
+        verbose: Print a per-field summary of the changes instead of a one-line count
+    """
+    # Keep only known, non-protected fields that have a value
+    data = {key: value for key, value in data.items() if key in UPDATABLE_FIELDS and value is not None}
+    if not data:
+        print("No data to update (all values are null or not updatable)")
+        return
+        
+    with _LOCK:
+        cursor = _get_conn().cursor()
+        
+        # Take the write lock up front so the read and the update happen atomically
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            result = _prepare_update(cursor, patient_id, data)
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
     
-    if update_data:
-        # Construct the update query
-        update_query = 'UPDATE patient_records SET ' + ', '.join(f'{k} = ?' for k in update_data.keys()) + ' WHERE id = ?'
-        cursor.execute(update_query, list(update_data.values()) + [patient_id])
-        conn.commit()
+    if result is None:
+        print(f"No patient found with ID {patient_id}")
+        return
+    
+    update_data, added_items = result
+    if update_data and not verbose:
+        print(f"Updated {len(update_data)} field(s) for patient {patient_id}")
+    elif update_data:
         print(f"Record updated successfully for patient ID: {patient_id}")
         
         # Print what was updated
@@ -185,19 +337,10 @@ def update_record(patient_id: int, data: dict):
         for key, value in update_data.items():
             if key == 'notes':
                 print(f"{key}: Added new entry with timestamp")
+            elif key in added_items:
+                print(f"{key}: Added new items: {', '.join(sorted(added_items[key]))}")
             else:
-                if current_data.get(key) in [None, "None", ""]:
-                    print(f"{key}: Set initial value to: {value}")
-                else:
-                    current_items = {item.strip().lower() for item in str(current_data[key]).split(', ') if item.strip() and item.strip().lower() != 'none'}
-                    new_items = {item.strip().lower() for item in str(value).split(', ') if item.strip()}
-                    added_items = new_items - current_items
-                    if added_items:
-                        print(f"{key}: Added new items: {', '.join(sorted(added_items))}")
-                    else:
-                        print(f"{key}: No new items to add")
-    
-    conn.close()
+                print(f"{key}: Set initial value to: {value}")
 
 def get_patient_record(patient_id: int) -> dict:
     """
@@ -209,69 +352,106 @@ def get_patient_record(patient_id: int) -> dict:
     Returns:
         Dictionary containing the patient record, or None if not found
     """
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+    # Hold the lock so the read can't run inside another thread's open write transaction
+    with _LOCK:
+        cursor = _get_conn().cursor()
+        
+        # Use the view that includes calculated age
+        cursor.execute(SQL_GET_PATIENT, (patient_id,))
+        record = cursor.fetchone()
+    
+    # sqlite3.Row already maps column names, so no cursor.description lookup is needed
+    return dict(record) if record else None
+
+def get_patient_name(patient_id: int) -> dict:
+    """
+    Retrieve only the name of a patient, without reading the full record.
     
-    # Use the view that includes calculated age
-    cursor.execute('SELECT * FROM patient_records_with_age WHERE id = ?', (patient_id,))
-    record = cursor.fetchone()
+    Args:
+        patient_id: ID of the patient to look up
+        
+    Returns:
+        Dictionary with first_name and last_name, or None if not found
+    """
+    with _LOCK:
+        cursor = _get_conn().cursor()
+        cursor.execute(SQL_GET_PATIENT_NAME, (patient_id,))
+        record = cursor.fetchone()
     
     if record:
-        # Get column names
-        columns = [description[0] for description in cursor.description]
-        # Convert to dictionary
-        result = dict(zip(columns, record))
-    else:
-        result = None
+        return {'first_name': record[0], 'last_name': record[1]}
+    return None
+
+def add_output_files(patient_id: int, files: list):
+    """
+    Record the transcription and analysis files written for a patient.
+    
+    Args:
+        patient_id: ID of the patient the files belong to
+        files: List of (filename, file_type) tuples, where filename is the base name in
+            the web output directory and file_type is e.g. 'transcription' or 'analysis'
+    """
+    with _LOCK:
+        conn = _get_conn()
+        # One transaction, so every row lands with a single commit
+        conn.execute('BEGIN')
+        try:
+            conn.executemany(SQL_ADD_OUTPUT_FILE, [(patient_id, filename, file_type) for filename, file_type in files])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+def add_transcript(patient_id: int, transcript: str, analysis: dict = None):
+    """
+    Store a recording's transcript and its analysis for the web app's transcript history.
     
-    conn.close()
-    return result
+    Args:
+        patient_id: ID of the patient the transcript belongs to
+        transcript: The transcribed text
+        analysis: Dictionary with 'key_points' and 'timestamp', or None to leave it for the
+            web app to fill in
+    """
+    # Compact separators keep the stored JSON small; nothing is serialized without an analysis
+    analysis_json = json.dumps(analysis, separators=(',', ':'), ensure_ascii=False) if analysis else None
+    with _LOCK:
+        _get_conn().execute(SQL_ADD_TRANSCRIPT, (patient_id, transcript, analysis_json))
 
 def get_all_records():
     """Retrieve all records from the database."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
-    # Use the view that includes calculated age
-    cursor.execute('SELECT * FROM patient_records_with_age')
-    records = cursor.fetchall()
-    
-    # Get column names
-    columns = [description[0] for description in cursor.description]
-    
-    # Convert to list of dictionaries
-    result = []
-    for record in records:
-        result.append(dict(zip(columns, record)))
-    
-    conn.close()
-    return result
+    with _LOCK:
+        cursor = _get_conn().cursor()
+        
+        # Use the view that includes calculated age
+        cursor.execute(SQL_ALL_RECORDS)
+        
+        # Rows come back as sqlite3.Row, which converts straight to a dictionary
+        return [dict(record) for record in cursor.fetchall()]
 
 def list_patients():
     """List all patients with their basic information."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
-    # Use the view that includes calculated age
-    cursor.execute('SELECT id, first_name, last_name, age, gender FROM patient_records_with_age')
-    patients = cursor.fetchall()
+    with _LOCK:
+        cursor = _get_conn().cursor()
+        
+        # Use the narrow summary view that includes calculated age
+        cursor.execute(SQL_LIST_PATIENTS)
+        patients = cursor.fetchall()
     
     if not patients:
         print("No patients in database")
         return
     
-    print("\nAvailable patients:")
-    print("-" * 50)
-    for patient in patients:
-        patient_id, first_name, last_name, age, gender = patient
+    # Build the whole listing first and write it in one call instead of five prints per patient
+    separator = "-" * 50
+    lines = ["\nAvailable patients:", separator]
+    for patient_id, first_name, last_name, age, gender in patients:
         full_name = f"{first_name or ''} {last_name or ''}".strip()
-        print(f"ID: {patient_id}")
-        print(f"Name: {full_name or 'Not specified'}")
-        print(f"Age: {age or 'Not specified'}")
-        print(f"Gender: {gender or 'Not specified'}")
-        print("-" * 50)
-    
-    conn.close()
+        lines.append(f"ID: {patient_id}\n"
+                     f"Name: {full_name or 'Not specified'}\n"
+                     f"Age: {age or 'Not specified'}\n"
+                     f"Gender: {gender or 'Not specified'}\n"
+                     f"{separator}")
+    sys.stdout.write("\n".join(lines) + "\n")
 
 if __name__ == "__main__":
     create_database()
@@ -1,26 +1,26 @@
-from recorder import AudioRecorder
-from transcriber import AudioTranscriber
 import time
 import os
-import speech_recognition as sr
 from datetime import datetime
-from groq import Groq
-from dotenv import load_dotenv
 import json
-from create_database import create_database, update_record, get_patient_record, list_patients
+import asyncio
+import orjson
+import hashlib
+import atexit
+import tempfile
+from collections import OrderedDict
+from create_database import create_database, update_record, get_patient_record, get_patient_name, list_patients, add_output_files, add_transcript
 import threading
 import sys
 import select
 import signal
-import sqlite3
+
+# Heavy dependencies (groq, speech_recognition, audio capture, dotenv) are imported
+# where they are first needed so the script starts up without paying for them
 
 # Get the absolute path to the database
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE_PATH = os.path.join(SCRIPT_DIR, 'medical_records.db')
 
-# Load environment variables from .env file
-load_dotenv()
-
 # Define all possible database fields
 DB_FIELDS = [
     "symptoms",
@@ -35,32 +35,13 @@ DB_FIELDS = [
     "notes"
 ]
 
-# Global flag for recording state
-is_recording = True
-
-def signal_handler(signum, frame):
-    """Handle the stop signal from the web app"""
-    global is_recording
-    is_recording = False
-    print("\nStop signal received, finishing recording...")
-
-def analyze_with_groq(text: str, api_key: str) -> dict:
-    """
-    Analyze transcribed text using Groq's LLaMA model and structure it for database input.
-    Preserves existing data and only updates allowed fields.
-    
-    Args:
-        text: The transcribed text to analyze
-        api_key: Groq API key
-    """
-    client = Groq(api_key=api_key)
-    
-    # Construct the prompt
-    field_list = "\n".join([f"- {field}: (null if not mentioned)" for field in DB_FIELDS])
-    prompt = f"""You are a medical data extraction assistant. Your task is to extract medical information from the conversation and format it as a valid JSON object.
+# Static extraction instructions built once from DB_FIELDS and sent as the system message,
+# so every call shares the same prompt prefix and only the transcript varies
+_FIELD_LIST = "\n".join([f"- {field}: (null if not mentioned)" for field in DB_FIELDS])
+EXTRACTION_PROMPT = f"""You are a medical data extraction assistant. Your task is to extract medical information from the conversation and format it as a valid JSON object.
 
 Required fields to extract:
-{field_list}
+{_FIELD_LIST}
 
 Guidelines:
 1. Extract both explicit and implicit information
@@ -87,45 +68,212 @@ Example output format:
     "notes": "Patient exercises regularly"
 }}
 
-Analyze this transcript and provide only a JSON object with the extracted information:
-{text}"""
+The user message is the transcript. Respond with only a JSON object with the extracted information.
+"""
+
+# Analysis results cached by normalized transcript hash, persisted between runs; the
+# least recently used entries are dropped beyond ANALYSIS_CACHE_SIZE
+ANALYSIS_CACHE_PATH = os.path.join(SCRIPT_DIR, 'output', '.analysis_cache.json')
+ANALYSIS_CACHE_SIZE = 256
+_analysis_cache = None
+
+# Global flag for recording state
+is_recording = True
+
+# Groq client shared by every analysis call in this process
+_groq_client = None
+
+# Field extraction is a short structured task, so the small fast model is enough
+GROQ_MODEL = "llama-3.1-8b-instant"
+# Ten short fields fit well within this; the cap keeps a runaway response from adding latency
+MAX_ANALYSIS_TOKENS = 512
+
+def get_groq_client(api_key: str):
+    """Return the shared async Groq client, creating it on first use."""
+    global _groq_client
+    if _groq_client is None:
+        import httpx
+        from groq import AsyncGroq
+        # Keep-alive pool so repeated calls reuse the TLS connection
+        _groq_client = AsyncGroq(
+            api_key=api_key,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+                timeout=30.0,
+            ),
+        )
+    return _groq_client
+
+def _load_analysis_cache() -> OrderedDict:
+    """Return the analysis cache, oldest entry first, reading it from disk on first use."""
+    global _analysis_cache
+    if _analysis_cache is None:
+        try:
+            with open(ANALYSIS_CACHE_PATH, 'r') as f:
+                _analysis_cache = OrderedDict(json.load(f))
+        except (OSError, ValueError, TypeError):
+            _analysis_cache = OrderedDict()
+        _trim_analysis_cache()
+        atexit.register(_save_analysis_cache)
+    return _analysis_cache
+
+def _trim_analysis_cache():
+    """Drop the least recently used analyses beyond ANALYSIS_CACHE_SIZE."""
+    while len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+        _analysis_cache.popitem(last=False)
+
+def _save_analysis_cache():
+    """
+    Write the analysis cache back to disk.
+    
+    The cache is written to a private temporary file and renamed over the old one, so a
+    crash or a concurrent run can't leave it half written.
+    """
+    cache_dir = os.path.dirname(ANALYSIS_CACHE_PATH)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.analysis_cache.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(_analysis_cache, f)
+            os.replace(tmp_path, ANALYSIS_CACHE_PATH)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    except OSError as e:
+        print(f"Error saving analysis cache: {e}")
+
+def _analysis_cache_key(text: str) -> str:
+    """Hash the transcript after normalizing case and whitespace."""
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+def signal_handler(signum, frame):
+    """Handle the stop signal from the web app"""
+    global is_recording
+    is_recording = False
+    print("\nStop signal received, finishing recording...")
 
+async def analyze_with_groq(text: str, api_key: str) -> dict:
+    """
+    Analyze transcribed text using Groq's LLaMA model and structure it for database input.
+    Preserves existing data and only updates allowed fields.
+    
+    Args:
+        text: The transcribed text to analyze
+        api_key: Groq API key
+    """
+    # Reuse the stored result if the same transcript (ignoring case and spacing) was analyzed before
+    cache = _load_analysis_cache()
+    cache_key = _analysis_cache_key(text)
+    if cache_key in cache:
+        print("Using cached analysis for this transcript")
+        cache.move_to_end(cache_key)
+        return dict(cache[cache_key])
+    
+    client = get_groq_client(api_key)
+    
     # Call Groq API
-    chat_completion = client.chat.completions.create(
+    chat_completion = await client.chat.completions.create(
         messages=[
+            {
+                "role": "system",
+                "content": EXTRACTION_PROMPT
+            },
             {
                 "role": "user",
-                "content": prompt
+                "content": text
             }
         ],
-        model="llama-3.3-70b-versatile",
-        temperature=0.5,  # Lower temperature for more consistent output
+        model=GROQ_MODEL,
+        temperature=0,  # Deterministic output for extraction
+        response_format={"type": "json_object"},  # JSON mode guarantees a bare JSON object
+        max_tokens=MAX_ANALYSIS_TOKENS,
     )
     
     # Parse the response as JSON
     try:
         response_text = chat_completion.choices[0].message.content
-        # Try to find JSON object in the response
-        start = response_text.find('{')
-        end = response_text.rfind('}') + 1
-        if start >= 0 and end > start:
-            json_str = response_text[start:end]
-            return json.loads(json_str)
-        else:
-            print("Error: No JSON object found in response")
-            return {}
+        analysis = json.loads(response_text)
     except json.JSONDecodeError:
         print("Error: Could not parse Groq response as JSON")
         print("Response was:", response_text)
         return {}
+    
+    cache[cache_key] = analysis
+    _trim_analysis_cache()
+    return dict(analysis)
+
+def _write_transcription(filepath: str, text: str, recorded_at: str):
+    """Write the raw transcription text file."""
+    with open(filepath, 'w') as f:
+        f.write(f"Transcription recorded at {recorded_at}\n{'-' * 50}\n\n{text}")
+
+def _write_analysis(filepath: str, text: str, analysis: dict, recorded_at: str):
+    """Write the analysis JSON file; orjson serializes straight to bytes, so write in binary mode."""
+    with open(filepath, 'wb') as f:
+        f.write(orjson.dumps({
+            "timestamp": recorded_at,
+            "transcription": text,
+            "extracted_information": analysis
+        }, option=orjson.OPT_INDENT_2))
 
-def check_for_enter():
-    """Check if Enter was pressed"""
-    while True:
-        if select.select([sys.stdin], [], [], 0.1)[0]:  # 0.1 second timeout
-            sys.stdin.readline()
-            return True
-    return False
+def transcript_analysis(analysis: dict, recorded_at: str) -> dict:
+    """Turn the extracted fields into the key points the web app's transcript history shows."""
+    return {
+        "key_points": [{"category": field.replace('_', ' ').title(), "text": str(value)}
+                       for field, value in analysis.items() if value and value != "null"],
+        "timestamp": recorded_at
+    }
+
+def _update_and_fetch(patient_id: int, analysis: dict) -> dict:
+    """Apply the analysis to the patient record and return the updated record."""
+    update_record(patient_id, analysis)
+    return get_patient_record(patient_id)
+
+async def process_transcription(text: str, api_key: str, patient_id: int, text_filepath: str,
+                                analysis_filepath: str, recorded_at: str) -> tuple:
+    """
+    Analyze a transcription and save the results, overlapping the independent steps.
+    
+    The transcription file is written while Groq analyzes the text, then the analysis
+    file is written while the patient record is updated and read back.
+    
+    Args:
+        text: The transcribed text to analyze
+        api_key: Groq API key
+        patient_id: ID of the patient to update
+        text_filepath: Where to write the transcription text
+        analysis_filepath: Where to write the analysis JSON
+        recorded_at: Timestamp written into both files
+        
+    Returns:
+        Tuple of (extracted information, updated patient record)
+    """
+    print("\nAnalyzing transcription with Groq...")
+    analysis, _ = await asyncio.gather(
+        analyze_with_groq(text, api_key),
+        asyncio.to_thread(_write_transcription, text_filepath, text, recorded_at),
+    )
+    print("\nExtracted Information:")
+    print(json.dumps(analysis, indent=2))
+    
+    print("\nUpdating database...")
+    _, updated_patient = await asyncio.gather(
+        asyncio.to_thread(_write_analysis, analysis_filepath, text, analysis, recorded_at),
+        asyncio.to_thread(_update_and_fetch, patient_id, analysis),
+    )
+    return analysis, updated_patient
+
+def watch_for_enter():
+    """Stop recording when Enter is pressed, by sending ourselves the stop signal"""
+    def wait_for_enter():
+        # Block without a timeout so the thread sleeps until input arrives
+        select.select([sys.stdin], [], [])
+        sys.stdin.readline()
+        os.kill(os.getpid(), signal.SIGTERM)
+    
+    threading.Thread(target=wait_for_enter, daemon=True).start()
 
 def main():
     """
@@ -133,8 +281,17 @@ def main():
     Recording stops after silence duration or when stop signal received.
     """
     
-    # Set up signal handler
-    signal.signal(signal.SIGUSR1, signal_handler)
+    # Set up signal handler; SIGTERM finishes the recording instead of killing the process,
+    # so the web app can stop us with terminate()
+    signal.signal(signal.SIGTERM, signal_handler)
+    
+    # Allow stopping with Enter when run from a terminal
+    if sys.stdin.isatty():
+        watch_for_enter()
+    
+    # Load environment variables from .env file
+    from dotenv import load_dotenv
+    load_dotenv()
     
     # Get Groq API key from environment
     api_key = os.getenv("GROQ_API_KEY")
@@ -157,7 +314,7 @@ def main():
     try:
         patient_id = int(sys.argv[1])
         print(f"Looking for patient ID: {patient_id}")  # Debug print
-        patient = get_patient_record(patient_id)
+        patient = get_patient_name(patient_id)
         if not patient:
             print("Patient not found in database.")
             return
@@ -168,6 +325,11 @@ def main():
         print("Invalid patient ID")
         return
 
+    # Import audio capture only once the patient is known
+    import speech_recognition as sr
+    from recorder import AudioRecorder
+    from transcriber import AudioTranscriber
+    
     # Initialize recorder and transcriber
     recorder = AudioRecorder()
     transcriber = AudioTranscriber()
@@ -193,84 +355,53 @@ def main():
             transcriber.recognizer.phrase_threshold = 0.3    # Shorter minimum speaking time
             transcriber.recognizer.non_speaking_duration = 0.8  # Shorter silence detection
             
-            try:
-                # Listen with timeout to check is_recording flag
-                while is_recording:
-                    try:
-                        audio = transcriber.recognizer.listen(source, timeout=1)
-                        if audio:
-                            break
-                    except sr.WaitTimeoutError:
-                        continue
+            # Listen with timeout to check is_recording flag
+            audio = None
+            while is_recording:
+                try:
+                    audio = transcriber.recognizer.listen(source, timeout=1)
+                    if audio:
+                        break
+                except sr.WaitTimeoutError:
+                    continue
+            
+            # Convert audio to text with the local Whisper model
+            text = transcriber.transcribe_audio(audio) if audio else None
+            if audio and not text:
+                print("\nTranscription failed. Please try speaking louder and more clearly.")
+            
+            if text:
+                print("\nTranscription:")
+                print(text)
                 
-                if audio:
-                    # Convert audio to text
-                    text = transcriber.recognizer.recognize_google(audio)
-                    print("\nTranscription:")
-                    print(text)
-                    
-                    # Analyze with Groq
-                    print("\nAnalyzing transcription with Groq...")
-                    analysis = analyze_with_groq(text, api_key)
-                    print("\nExtracted Information:")
-                    print(json.dumps(analysis, indent=2))
-                    
-                    # Update database
-                    print("\nUpdating database...")
-                    update_record(patient_id, analysis)
-                    
-                    # Save transcription and analysis to files
-                    text_filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web', 'output', os.path.basename(text_filename))
-                    analysis_filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web', 'output', os.path.basename(analysis_filename))
-                    
-                    # Create output directory if it doesn't exist
-                    os.makedirs(os.path.dirname(text_filepath), exist_ok=True)
-                    
-                    # Save files in web output directory
-                    with open(text_filepath, 'w') as f:
-                        f.write(f"Transcription recorded at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                        f.write("-" * 50 + "\n\n")
-                        f.write(text)
-                    
-                    with open(analysis_filepath, 'w') as f:
-                        json.dump({
-                            "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                            "transcription": text,
-                            "extracted_information": analysis
-                        }, f, indent=2)
-                    
-                    # Store file references in database
-                    conn = sqlite3.connect(DATABASE_PATH)
-                    cursor = conn.cursor()
-                    
-                    # Add files to output_files table
-                    cursor.execute('''
-                        INSERT INTO output_files (patient_id, filename, file_type)
-                        VALUES (?, ?, ?)
-                    ''', (patient_id, os.path.basename(text_filename), 'transcription'))
-                    
-                    cursor.execute('''
-                        INSERT INTO output_files (patient_id, filename, file_type)
-                        VALUES (?, ?, ?)
-                    ''', (patient_id, os.path.basename(analysis_filename), 'analysis'))
-                    
-                    conn.commit()
-                    conn.close()
-                    
-                    print(f"\nTranscription saved to: {text_filepath}")
-                    print(f"Analysis saved to: {analysis_filepath}")
-                    
-                    # Display updated patient record
-                    print("\nUpdated patient record:")
-                    updated_patient = get_patient_record(patient_id)
-                    for key, value in updated_patient.items():
-                        if value is not None:
-                            print(f"{key}: {value}")
+                # Save transcription and analysis to files in the web output directory
+                text_filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web', 'output', os.path.basename(text_filename))
+                analysis_filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'web', 'output', os.path.basename(analysis_filename))
                 
-            except sr.UnknownValueError:
-                print("\nTranscription failed. Please try speaking louder and more clearly.")
-            except sr.RequestError as e:
-                print(f"\nCould not request results from speech recognition service; {e}")
+                # Create output directory if it doesn't exist
+                os.makedirs(os.path.dirname(text_filepath), exist_ok=True)
+                recorded_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                
+                # Analyze, update the record and write both files
+                analysis, updated_patient = asyncio.run(process_transcription(
+                    text, api_key, patient_id, text_filepath, analysis_filepath, recorded_at))
+                
+                # Store file references in database over the shared connection
+                add_output_files(patient_id, [
+                    (os.path.basename(text_filename), 'transcription'),
+                    (os.path.basename(analysis_filename), 'analysis'),
+                ])
+                
+                # Store the transcript and its key points for the transcript history
+                add_transcript(patient_id, text, transcript_analysis(analysis, recorded_at))
+                
+                print(f"\nTranscription saved to: {text_filepath}")
+                print(f"Analysis saved to: {analysis_filepath}")
+                
+                # Display updated patient record
+                print("\nUpdated patient record:")
+                sys.stdout.write("".join(f"{key}: {value}\n" for key, value in updated_patient.items()
+                                         if value is not None))
 
     except KeyboardInterrupt:
         print("\nRecording interrupted by user")
@@ -5,6 +5,25 @@ import time
 from typing import Optional
 import numpy as np
 
+# Seconds of audio the sample buffer holds before it has to grow
+INITIAL_BUFFER_SECONDS = 60
+
+# Index of the MacBook Pro's built-in microphone, looked up once per process
+_mic_index = None
+_mic_scanned = False
+
+def find_macbook_mic(audio: pyaudio.PyAudio) -> Optional[int]:
+    """Return the MacBook Pro microphone's device index, scanning the devices only on the first call."""
+    global _mic_index, _mic_scanned
+    if not _mic_scanned:
+        for i in range(audio.get_device_count()):
+            device_info = audio.get_device_info_by_index(i)
+            if "macbook pro microphone" in device_info["name"].lower():
+                _mic_index = i
+                break
+        _mic_scanned = True
+    return _mic_index
+
 class AudioRecorder:
     """
     A class to handle real-time audio recording from the microphone.
@@ -22,30 +41,27 @@ class AudioRecorder:
             chunk: Number of frames per buffer (affects latency and CPU usage)
             
         Note:
-            Uses 32-bit float format for better audio quality.
+            Uses 16-bit integer PCM, the format speech recognizers consume directly.
             Automatically detects and configures the MacBook Pro's microphone.
         """
         # Audio configuration parameters
         self.channels = channels          # Number of audio channels
         self.rate = rate                  # Sample rate (Hz)
         self.chunk = chunk               # Buffer size
-        self.format = pyaudio.paFloat32   # 32-bit float format for better quality
+        self.format = pyaudio.paInt16     # 16-bit PCM, all speech recognition needs
+        self.dtype = np.int16             # numpy type matching self.format
         
         # Initialize PyAudio system
         self.audio = pyaudio.PyAudio()
         
         # Recording state variables
         self.stream: Optional[pyaudio.Stream] = None
-        self.frames = []                  # List to store audio frames
+        self._buf = np.empty(0, dtype=self.dtype)  # Preallocated sample buffer
+        self._pos = 0                     # Number of samples written to the buffer
         self.is_recording = False         # Recording state flag
 
         # Find the MacBook Pro's built-in microphone
-        self.device_index = None
-        for i in range(self.audio.get_device_count()):
-            device_info = self.audio.get_device_info_by_index(i)
-            if "macbook pro microphone" in device_info["name"].lower():
-                self.device_index = i
-                break
+        self.device_index = find_macbook_mic(self.audio)
 
     def start_recording(self):
         """
@@ -62,8 +78,9 @@ class AudioRecorder:
         if self.is_recording:
             return  # Prevent multiple recording sessions
 
-        # Reset recording state
-        self.frames = []
+        # Reset recording state (a fresh buffer, since arrays returned earlier may still view the old one)
+        self._buf = np.empty(self.rate * self.channels * INITIAL_BUFFER_SECONDS, dtype=self.dtype)
+        self._pos = 0
         self.is_recording = True
         
         # Configure and open the audio stream
@@ -93,7 +110,17 @@ class AudioRecorder:
         Returns:
             Tuple of (None, pyaudio.paContinue) to continue recording
         """
-        self.frames.append(in_data)
+        samples = np.frombuffer(in_data, dtype=self.dtype)
+        end = self._pos + samples.size
+        
+        # Double the buffer when it fills up so appends stay amortized O(1)
+        if end > self._buf.size:
+            grown = np.empty(max(end, 2 * self._buf.size), dtype=self.dtype)
+            grown[:self._pos] = self._buf[:self._pos]
+            self._buf = grown
+        
+        self._buf[self._pos:end] = samples
+        self._pos = end
         return (None, pyaudio.paContinue)
 
     def stop_recording(self) -> np.ndarray:
@@ -103,13 +130,13 @@ class AudioRecorder:
         Process:
         1. Stops the audio stream
         2. Closes the stream
-        3. Converts recorded frames to numpy array
+        3. Returns the recorded samples as a numpy array
         
         Returns:
-            Recorded audio as a numpy array (32-bit float format)
+            Recorded audio as a numpy array (16-bit integer format)
         """
         if not self.is_recording:
-            return np.array([])
+            return np.empty(0, dtype=self.dtype)
 
         # Stop recording
         self.is_recording = False
@@ -120,9 +147,8 @@ class AudioRecorder:
             self.stream.close()
             self.stream = None
 
-        # Convert recorded frames to numpy array
-        audio_data = np.frombuffer(b''.join(self.frames), dtype=np.float32)
-        return audio_data
+        # The recorded samples are already contiguous, so return a view
+        return self._buf[:self._pos]
 
     def save_to_wav(self, filename: str):
         """
@@ -135,14 +161,14 @@ class AudioRecorder:
             Saves in the same format as recorded (channels, sample rate).
             Does nothing if no audio has been recorded.
         """
-        if not self.frames:
+        if not self._pos:
             return
 
         with wave.open(filename, 'wb') as wf:
             wf.setnchannels(self.channels)
             wf.setsampwidth(self.audio.get_sample_size(self.format))
             wf.setframerate(self.rate)
-            wf.writeframes(b''.join(self.frames))
+            wf.writeframes(memoryview(self._buf[:self._pos]))
 
     def __del__(self):
         """
@@ -1,14 +1,36 @@
 import speech_recognition as sr
 import numpy as np
 from typing import Optional, Union
-import io
-import wave
+from functools import lru_cache
+
+# Local Whisper model used for all transcription, loaded on first use
+WHISPER_MODEL_NAME = "base.en"
+# Sample rate Whisper models expect; captured audio is resampled to it
+WHISPER_SAMPLE_RATE = 16000
+_whisper_model = None
+
+def get_whisper_model():
+    """Return the shared faster-whisper model, loading it on first use."""
+    global _whisper_model
+    if _whisper_model is None:
+        from faster_whisper import WhisperModel
+        # int8 weights keep CPU inference fast without a GPU
+        _whisper_model = WhisperModel(WHISPER_MODEL_NAME, device="cpu", compute_type="int8")
+    return _whisper_model
+
+@lru_cache(maxsize=1)
+def find_macbook_mic() -> Optional[int]:
+    """Return the MacBook Pro microphone's index, listing the microphones only on the first call."""
+    for index, name in enumerate(sr.Microphone.list_microphone_names()):
+        if "macbook pro microphone" in name.lower():
+            return index
+    return None
 
 class AudioTranscriber:
     """
     A class to handle speech-to-text transcription using various input methods.
     Supports direct microphone input, audio file transcription, and raw audio data transcription.
-    Uses Google's Speech Recognition service for accurate transcription.
+    Transcribes locally with a faster-whisper model, so no audio leaves the machine.
     """
 
     def __init__(self):
@@ -26,52 +48,48 @@ class AudioTranscriber:
         self.recognizer.pause_threshold = 2.0       # Wait 2 seconds of silence before considering the phrase complete
         
         # Attempt to find and configure the MacBook Pro's built-in microphone
-        mics = sr.Microphone.list_microphone_names()
-        self.device_index = None
-        for index, name in enumerate(mics):
-            if "macbook pro microphone" in name.lower():
-                self.device_index = index
-                break
+        self.device_index = find_macbook_mic()
+
+    def transcribe_audio(self, audio: sr.AudioData) -> Optional[str]:
+        """
+        Transcribe captured speech with the local Whisper model.
+        
+        Args:
+            audio: Speech captured by the recognizer, at any sample rate and width
+            
+        Returns:
+            Transcribed text if successful, None if no speech was recognized
+        """
+        try:
+            # Whisper takes 16 kHz mono samples as floats in [-1, 1]
+            pcm = audio.get_raw_data(convert_rate=WHISPER_SAMPLE_RATE, convert_width=2)
+            samples = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+            
+            # Greedy decoding; segments are generated lazily as they are joined
+            segments, _ = get_whisper_model().transcribe(samples, beam_size=1)
+            text = " ".join(segment.text.strip() for segment in segments)
+        except Exception as e:
+            print(f"Error transcribing audio: {e}")
+            return None
+        
+        if not text:
+            print("Speech recognition could not understand the audio")
+        return text or None
 
     def transcribe_audio_data(self, audio_data: np.ndarray, sample_rate: int = 44100) -> Optional[str]:
         """
         Convert raw audio data (numpy array) into text using speech recognition.
         
-        Process:
-        1. Converts numpy array to WAV format in memory
-        2. Creates an AudioFile object from the WAV data
-        3. Performs speech recognition on the audio
-        
         Args:
-            audio_data: Raw audio data as a numpy array
+            audio_data: Raw 16-bit PCM audio data as a numpy array, as returned by AudioRecorder
             sample_rate: Audio sampling rate in Hz (default: 44100)
             
         Returns:
             Transcribed text if successful, None if transcription fails
         """
-        # Step 1: Create an in-memory WAV file
-        byte_io = io.BytesIO()
-        with wave.open(byte_io, 'wb') as wav_file:
-            wav_file.setnchannels(1)              # Mono audio
-            wav_file.setsampwidth(2)              # 2 bytes per sample (16-bit audio)
-            wav_file.setframerate(sample_rate)    # Set the sample rate
-            wav_file.writeframes(audio_data.tobytes())
-        
-        # Step 2: Create AudioData object from the WAV file
-        byte_io.seek(0)  # Reset buffer position to start
-        with sr.AudioFile(byte_io) as source:
-            audio = self.recognizer.record(source)
-        
-        # Step 3: Attempt transcription
-        try:
-            text = self.recognizer.recognize_google(audio)
-            return text
-        except sr.UnknownValueError:
-            print("Speech recognition could not understand the audio")
-            return None
-        except sr.RequestError as e:
-            print(f"Could not request results from speech recognition service; {e}")
-            return None
+        # Wrap the samples directly; 2 bytes per sample for 16-bit audio
+        audio = sr.AudioData(audio_data.astype(np.int16, copy=False).tobytes(), sample_rate, 2)
+        return self.transcribe_audio(audio)
 
     def transcribe_file(self, audio_file: str) -> Optional[str]:
         """
@@ -84,16 +102,14 @@ class AudioTranscriber:
             Transcribed text if successful, None if transcription fails
             
         Note:
-            The file should be a WAV file with proper formatting.
+            Transcribes locally with faster-whisper, so no network round trip is needed.
             Handles errors that might occur during file reading or transcription.
         """
         try:
-            with sr.AudioFile(audio_file) as source:
-                # Record the entire file into an AudioData object
-                audio = self.recognizer.record(source)
-                # Perform the transcription
-                text = self.recognizer.recognize_google(audio)
-                return text
+            # Greedy decoding; segments are generated lazily as they are joined
+            segments, _ = get_whisper_model().transcribe(audio_file, beam_size=1)
+            text = " ".join(segment.text.strip() for segment in segments)
+            return text or None
         except Exception as e:
             print(f"Error transcribing audio file: {e}")
             return None
@@ -130,16 +146,9 @@ class AudioTranscriber:
                 
                 # Step 2: Listen for speech
                 audio = self.recognizer.listen(source, timeout=timeout)
-                
-                # Step 3: Perform transcription
-                text = self.recognizer.recognize_google(audio)
-                return text
             except sr.WaitTimeoutError:
                 print("Listening timed out")
                 return None
-            except sr.UnknownValueError:
-                print("Speech recognition could not understand the audio")
-                return None
-            except sr.RequestError as e:
-                print(f"Could not request results from speech recognition service; {e}")
-                return None 
\ No newline at end of file
+        
+        # Step 3: Perform transcription, after the microphone is released
+        return self.transcribe_audio(audio) 
\ No newline at end of file
@@ -2,6 +2,18 @@ from audio.recorder import AudioRecorder
 from audio.transcriber import AudioTranscriber
 import spacy
 import time
+import os
+from functools import lru_cache
+
+# The small CPU model is enough to check NER and sentence splitting; set
+# NURSE_SPACY_MODEL=en_core_web_trf to test the transformer pipeline instead
+SPACY_MODEL = os.getenv("NURSE_SPACY_MODEL", "en_core_web_sm")
+
+@lru_cache(maxsize=1)
+def get_nlp():
+    """Load the spaCy model once per process."""
+    # Only entities and sentences are used, so skip the tagging and lemmatization components
+    return spacy.load(SPACY_MODEL, disable=["tagger", "lemmatizer", "attribute_ruler"])
 
 def test_audio_and_transcription():
     print("Testing audio recording and transcription...")
@@ -37,8 +49,8 @@ def test_nlp():
     print("\nTesting NLP functionality...")
     
     try:
-        # Load the spaCy model
-        nlp = spacy.load("en_core_web_trf")
+        # Load the spaCy model (cached after the first call)
+        nlp = get_nlp()
         
         # Test text
         test_text = "The patient complained of severe headache and nausea. Dr. Smith prescribed 500mg of acetaminophen."
@@ -1,54 +1,167 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, send_file, make_response, send_from_directory
+from flask import Flask, Response, render_template, request, redirect, url_for, jsonify, send_file, make_response, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import sqlite3
 from datetime import datetime
 import subprocess
-import signal
+import threading
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from cachetools import TTLCache
 import os
+import sys
 import traceback  # Add this for better error tracking
-from weasyprint import HTML
-import tempfile
-import io
-import json
+import hashlib
+import re
+from bisect import bisect_left
+import orjson
 from chat_service import ChatService
+from pdf_renderer import render_pdf
 from dotenv import load_dotenv
 
 load_dotenv()  # Load environment variables from .env file
 
+class ORJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes and decodes with orjson, keeping Flask's fallbacks for other types."""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)  # jsonify and request.get_json go through orjson
 CORS(app)  # Enable CORS for all routes
 
-# Global variable to store the current recording process
-recording_process = None
+# Running recording processes by patient ID, shared by the request threads; a stopped
+# recorder stays registered, and listed in _stopping, until it has exited
+_recordings = {}
+_stopping = set()
+_rec_lock = threading.Lock()
+
+# How long a stopped recorder gets to transcribe, analyze and save before it is killed
+RECORDER_STOP_TIMEOUT = 120
+
+# Transcription and analysis files written by the recorder
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
+
+# Recording script, launched with the same interpreter that runs the app
+RECORDING_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'audio', 'example.py')
 
 # Create a single instance of ChatService to maintain conversation history
 chat_service = ChatService()
 
+# Absolute path so the database is found regardless of the working directory
+DATABASE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'audio', 'medical_records.db')
+
+# Tuning applied once per connection: WAL with NORMAL sync drops the per-commit fsync and lets
+# the recorder write while pages are served, busy_timeout waits out its brief write locks
+# instead of failing, and the page cache and memory map keep reads in RAM
+CONNECTION_PRAGMAS = '''
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA busy_timeout=5000;
+PRAGMA cache_size=-64000;
+PRAGMA temp_store=MEMORY;
+PRAGMA mmap_size=268435456;
+PRAGMA foreign_keys=ON;
+'''
+
+# Patient columns the pages, reports and JSON endpoint read; bookkeeping timestamps are left out
+PATIENT_FIELDS = (
+    'id', 'first_name', 'last_name', 'age', 'gender', 'date_of_birth',
+    'symptoms', 'vital_signs', 'medications', 'allergies',
+    'medical_history', 'family_history', 'diagnosis',
+    'treatment_plan', 'follow_up_date', 'notes'
+)
+
+# Patient record plus their latest transcript for the report endpoints; the correlated
+# subquery picks one transcript through the (patient_id, timestamp) index
+SQL_GET_PATIENT_WITH_TRANSCRIPT = f'''
+    SELECT {', '.join('p.' + field for field in PATIENT_FIELDS)},
+           t.transcript AS transcript_text,
+           t.timestamp AS transcript_ts
+    FROM patient_records_with_age p
+    LEFT JOIN transcripts t ON t.id = (
+        SELECT id FROM transcripts
+        WHERE patient_id = p.id
+        ORDER BY timestamp DESC
+        LIMIT 1
+    )
+    WHERE p.id = ?
+'''
+
+# Database user_version once the test patient has been seeded
+SEED_VERSION = 1
+
+# Statements run on request paths, kept as constants so each connection's statement cache reuses them
+SQL_GET_PATIENT = f'SELECT {", ".join(PATIENT_FIELDS)} FROM patient_records_with_age WHERE id = ?'
+SQL_GET_PATIENT_RECORD = 'SELECT * FROM patient_records WHERE id = ?'
+# A patient's transcripts, newest first, with SQLite's JSON functions extracting the key points and
+# analysis time from the stored analysis; key_points is NULL only when no analysis is stored, and
+# '[]' when the stored analysis is malformed or has none
+SQL_GET_PATIENT_TRANSCRIPTS = '''
+    SELECT id, transcript, timestamp,
+           CASE
+               WHEN analysis IS NULL OR analysis = '' THEN NULL
+               WHEN json_valid(analysis) THEN COALESCE(json_extract(analysis, '$.key_points'), '[]')
+               ELSE '[]'
+           END AS key_points,
+           CASE WHEN json_valid(analysis) THEN json_extract(analysis, '$.timestamp') END AS analysis_ts
+    FROM transcripts
+    WHERE patient_id = ?
+    ORDER BY timestamp DESC
+'''
+SQL_SET_TRANSCRIPT_ANALYSIS = 'UPDATE transcripts SET analysis = ? WHERE id = ?'
+
+# One long-lived connection per request-handling thread
+_local = threading.local()
+
+# Recently read patient records, so dashboard polling doesn't re-query the same row; writes
+# through this app drop the entry, and the short TTL bounds staleness from the recorder's updates.
+# The cache lives in this process and only update_patient invalidates it, so it assumes the single
+# worker process wsgi.py runs; with more workers, a record written through one is served stale by
+# the others for up to the TTL
+_patient_cache = TTLCache(maxsize=1024, ttl=2.0)
+_patient_cache_lock = threading.Lock()
+
+def get_conn():
+    """Return this thread's database connection, opening it on first use."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False, cached_statements=256)
+        conn.executescript(CONNECTION_PRAGMAS)
+        # Rows double as mappings, so records convert with dict(row)
+        conn.row_factory = sqlite3.Row
+        _local.conn = conn
+    return conn
+
 def get_patient_record(patient_id):
     """Get a patient record from the database."""
-    conn = sqlite3.connect('../audio/medical_records.db')
-    cursor = conn.cursor()
-    
-    # Use the view that includes calculated age
-    cursor.execute('SELECT * FROM patient_records_with_age WHERE id = ?', (patient_id,))
-    record = cursor.fetchone()
-    
-    if record:
-        # Get column names
-        columns = [description[0] for description in cursor.description]
-        # Convert to dictionary
-        result = dict(zip(columns, record))
-    else:
-        result = None
-    
-    conn.close()
-    return result
+    with _patient_cache_lock:
+        patient = _patient_cache.get(patient_id)
+    if patient is None:
+        # Use the view that includes calculated age
+        row = get_conn().execute(SQL_GET_PATIENT, (patient_id,)).fetchone()
+        if row is None:
+            return None
+        patient = dict(row)
+        with _patient_cache_lock:
+            _patient_cache[patient_id] = patient
+    # Hand out a copy so callers can't modify the cached record
+    return dict(patient)
 
 def create_database():
     """Create the SQLite database with all necessary tables."""
-    conn = sqlite3.connect('../audio/medical_records.db')
+    conn = get_conn()
     cursor = conn.cursor()
     
+    # Run the whole setup as one transaction
+    cursor.execute('BEGIN')
+    
     # Create the patients table if it doesn't exist
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS patient_records (
@@ -73,11 +186,12 @@ def create_database():
     )
     ''')
     
-    # Check if we need to add a test patient
-    cursor.execute("SELECT COUNT(*) FROM patient_records")
-    count = cursor.fetchone()[0]
+    # The test patient is added once; user_version records that, so later
+    # startups only read a header field instead of querying the table
+    seeded = cursor.execute("PRAGMA user_version").fetchone()[0] >= SEED_VERSION
     
-    if count == 0:
+    # Check if we need to add a test patient; EXISTS stops at the first row instead of counting them all
+    if not seeded and not cursor.execute("SELECT EXISTS(SELECT 1 FROM patient_records)").fetchone()[0]:
         # Add a test patient
         cursor.execute('''
         INSERT INTO patient_records (
@@ -106,45 +220,113 @@ def create_database():
     )
     ''')
     
+    # Create the transcripts table if it doesn't exist
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS transcripts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id INTEGER,
+        transcript TEXT,
+        analysis TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (patient_id) REFERENCES patient_records (id)
+    )
+    ''')
+    
+    # Lets the latest-transcript lookup read one index entry instead of scanning and sorting
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS ix_transcripts_patient_ts
+    ON transcripts (patient_id, timestamp DESC)
+    ''')
+    
+    # Same for the transcript page's newest-first list of a patient's output files
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS ix_output_files_patient_created
+    ON output_files (patient_id, created_at DESC)
+    ''')
+    
+    # Committed together with the seed row
+    if not seeded:
+        cursor.execute(f"PRAGMA user_version = {SEED_VERSION}")
+    
     conn.commit()
-    conn.close()
 
-def get_patient_transcript(patient_id):
-    """Get the latest transcript for a patient."""
+def get_report_data(patient_id):
+    """
+    Get a patient record and their latest transcript in one query.
+    
+    Returns:
+        Tuple of (patient record or None, latest transcript dict or None)
+    """
     try:
-        conn = sqlite3.connect('../audio/medical_records.db')
-        cursor = conn.cursor()
-        
-        # First, check if the transcripts table exists
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transcripts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                patient_id INTEGER,
-                transcript TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (patient_id) REFERENCES patient_records (id)
-            )
-        ''')
-        conn.commit()
-        
-        cursor.execute('''
-            SELECT transcript, timestamp 
-            FROM transcripts 
-            WHERE patient_id = ? 
-            ORDER BY timestamp DESC 
-            LIMIT 1
-        ''', (patient_id,))
+        row = get_conn().execute(SQL_GET_PATIENT_WITH_TRANSCRIPT, (patient_id,)).fetchone()
+        if not row:
+            return None, None
         
-        result = cursor.fetchone()
-        conn.close()
+        patient = dict(row)
+        transcript_text = patient.pop('transcript_text')
+        transcript_ts = patient.pop('transcript_ts')
         
-        if result:
-            return {"transcript": result[0], "timestamp": result[1]}
-        return None
+        if transcript_text is not None:
+            return patient, {"transcript": transcript_text, "timestamp": transcript_ts}
+        return patient, None
     except Exception as e:
-        print(f"Error in get_patient_transcript: {e}")
+        print(f"Error in get_report_data: {e}")
         traceback.print_exc()
-        return None
+        return None, None
+
+# Clinical sections of the medical report, in order, as (heading, patient field)
+REPORT_SECTIONS = (
+    ("MEDICAL HISTORY", "medical_history"),
+    ("CURRENT MEDICATIONS", "medications"),
+    ("ALLERGIES", "allergies"),
+    ("VITAL SIGNS", "vital_signs"),
+    ("CURRENT SYMPTOMS", "symptoms"),
+    ("DIAGNOSIS", "diagnosis"),
+    ("TREATMENT PLAN", "treatment_plan"),
+)
+
+def _report_lines(patient_data, transcript_data):
+    """Yield the lines of the plain-text medical report."""
+    # Get current timestamp
+    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    get = patient_data.get
+    transcript = transcript_data.get('transcript') if transcript_data else None
+    notes = get('notes')
+    follow_up_date = get('follow_up_date')
+    
+    yield "MEDICAL REPORT"
+    yield f"Generated on: {current_time}\n"
+    
+    yield "PATIENT INFORMATION"
+    yield f"Name: {get('first_name', 'N/A')} {get('last_name', 'N/A')}"
+    yield f"ID: {get('id', 'N/A')}"
+    yield f"Age: {get('age', 'N/A')}"
+    yield f"Date of Birth: {get('date_of_birth', 'N/A')}"
+    yield f"Gender: {get('gender', 'N/A')}\n"
+    
+    # Add each clinical section that has a value
+    for label, key in REPORT_SECTIONS:
+        value = get(key)
+        if value:
+            yield label
+            yield f"{value}\n"
+
+    # Add transcript analysis if available
+    if transcript:
+        yield "VISIT TRANSCRIPT"
+        yield f"Recorded on: {transcript_data.get('timestamp', 'Date not recorded')}"
+        yield f"{transcript}\n"
+
+    # Add important notes if available
+    if notes:
+        yield "IMPORTANT NOTES"
+        yield f"{notes}\n"
+
+    # Add follow-up information if available
+    if follow_up_date:
+        yield "FOLLOW-UP"
+        yield f"Next appointment: {follow_up_date}\n"
 
 def generate_medical_report(patient_data, transcript_data):
     """Generate a comprehensive medical report."""
@@ -152,95 +334,8 @@ def generate_medical_report(patient_data, transcript_data):
         if not patient_data:
             return "Error: Patient data not found"
 
-        # Get current timestamp
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Start building the report
-        report_sections = [
-            f"MEDICAL REPORT",
-            f"Generated on: {current_time}\n",
-            
-            "PATIENT INFORMATION",
-            f"Name: {patient_data.get('first_name', 'N/A')} {patient_data.get('last_name', 'N/A')}",
-            f"ID: {patient_data.get('id', 'N/A')}",
-            f"Age: {patient_data.get('age', 'N/A')}",
-            f"Date of Birth: {patient_data.get('date_of_birth', 'N/A')}",
-            f"Gender: {patient_data.get('gender', 'N/A')}\n"
-        ]
-        
-        # Add medical history if available
-        if patient_data.get('medical_history'):
-            report_sections.extend([
-                "MEDICAL HISTORY",
-                f"{patient_data.get('medical_history')}\n"
-            ])
-        
-        # Add medications if available
-        if patient_data.get('medications'):
-            report_sections.extend([
-                "CURRENT MEDICATIONS",
-                f"{patient_data.get('medications')}\n"
-            ])
-        
-        # Add allergies if available
-        if patient_data.get('allergies'):
-            report_sections.extend([
-                "ALLERGIES",
-                f"{patient_data.get('allergies')}\n"
-            ])
-        
-        # Add vital signs if available
-        if patient_data.get('vital_signs'):
-            report_sections.extend([
-                "VITAL SIGNS",
-                f"{patient_data.get('vital_signs')}\n"
-            ])
-        
-        # Add symptoms if available
-        if patient_data.get('symptoms'):
-            report_sections.extend([
-                "CURRENT SYMPTOMS",
-                f"{patient_data.get('symptoms')}\n"
-            ])
-        
-        # Add diagnosis if available
-        if patient_data.get('diagnosis'):
-            report_sections.extend([
-                "DIAGNOSIS",
-                f"{patient_data.get('diagnosis')}\n"
-            ])
-        
-        # Add treatment plan if available
-        if patient_data.get('treatment_plan'):
-            report_sections.extend([
-                "TREATMENT PLAN",
-                f"{patient_data.get('treatment_plan')}\n"
-            ])
-
-        # Add transcript analysis if available
-        if transcript_data and transcript_data.get('transcript'):
-            report_sections.extend([
-                "VISIT TRANSCRIPT",
-                f"Recorded on: {transcript_data.get('timestamp', 'Date not recorded')}",
-                f"{transcript_data.get('transcript')}\n"
-            ])
-
-        # Add important notes if available
-        if patient_data.get('notes'):
-            report_sections.extend([
-                "IMPORTANT NOTES",
-                f"{patient_data.get('notes')}\n"
-            ])
-
-        # Add follow-up information if available
-        if patient_data.get('follow_up_date'):
-            report_sections.extend([
-                "FOLLOW-UP",
-                f"Next appointment: {patient_data.get('follow_up_date')}\n"
-            ])
-
-        # Join all sections with proper formatting
-        return "\n".join(report_sections)
+        # Join all sections with proper formatting in a single pass
+        return "\n".join(_report_lines(patient_data, transcript_data))
     except Exception as e:
         print(f"Error in generate_medical_report: {e}")
         traceback.print_exc()
@@ -277,6 +372,11 @@ def manual_entry(patient_id):
         return render_template('manual_entry.html', patient=patient)
     return redirect(url_for('index'))
 
+@lru_cache(maxsize=64)
+def update_patient_sql(columns):
+    """Build the UPDATE statement for a tuple of columns; identical SQL lets SQLite reuse the prepared statement."""
+    return 'UPDATE patient_records SET ' + ', '.join(f'{k} = ?' for k in columns) + ' WHERE id = ?'
+
 @app.route('/update_patient/<int:patient_id>', methods=['POST'])
 def update_patient(patient_id):
     # Get all form data
@@ -301,136 +401,102 @@ def update_patient(patient_id):
     # Remove empty fields
     data = {k: v for k, v in data.items() if v}
     
-    # Update database
-    conn = sqlite3.connect('../audio/medical_records.db')
-    cursor = conn.cursor()
-    
+    # Update database in one explicit write transaction
     if data:
-        update_query = 'UPDATE patient_records SET ' + ', '.join(f'{k} = ?' for k in data.keys()) + ' WHERE id = ?'
-        cursor.execute(update_query, list(data.values()) + [patient_id])
-        conn.commit()
-    
-    conn.close()
+        conn = get_conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(update_patient_sql(tuple(data)), list(data.values()) + [patient_id])
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            with _patient_cache_lock:
+                _patient_cache.pop(patient_id, None)
     
     return redirect(url_for('dashboard', patient_id=patient_id))
 
-def store_transcript(patient_id, transcript_text):
-    """Store a transcript in the database with its analysis."""
-    try:
-        conn = sqlite3.connect('../audio/medical_records.db')
-        cursor = conn.cursor()
-        
-        # Create transcripts table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transcripts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                patient_id INTEGER,
-                transcript TEXT,
-                analysis TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (patient_id) REFERENCES patient_records (id)
-            )
-        ''')
-        
-        # Generate analysis
-        analysis = analyze_transcript(transcript_text)
-        analysis_json = json.dumps(analysis) if analysis else None
-        
-        # Get the timestamp from the analysis file if available
-        output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                                'audio', 'output')
-        analysis_files = [f for f in os.listdir(output_dir) 
-                       if f.startswith('analysis_') and f.endswith('.json')]
-        
-        timestamp = None
-        if analysis_files:
-            latest_file = max(analysis_files, key=lambda x: os.path.getctime(os.path.join(output_dir, x)))
-            with open(os.path.join(output_dir, latest_file), 'r') as f:
-                analysis_data = json.load(f)
-                timestamp = analysis_data.get('timestamp')
-        
-        # Insert the transcript and its analysis with the correct timestamp
-        if timestamp:
-            cursor.execute('''
-                INSERT INTO transcripts (patient_id, transcript, analysis, timestamp)
-                VALUES (?, ?, ?, ?)
-            ''', (patient_id, transcript_text, analysis_json, timestamp))
-        else:
-            cursor.execute('''
-                INSERT INTO transcripts (patient_id, transcript, analysis)
-                VALUES (?, ?, ?)
-            ''', (patient_id, transcript_text, analysis_json))
-        
-        conn.commit()
-        conn.close()
-        
-        print(f"Stored transcript for patient {patient_id} with analysis")  # Debug print
-        return True
-    except Exception as e:
-        print(f"Error storing transcript: {e}")
-        traceback.print_exc()
-        return False
-
 @app.route('/start_recording/<int:patient_id>', methods=['POST'])
 def start_recording(patient_id):
-    global recording_process
+    with _rec_lock:
+        if patient_id in _stopping:
+            return jsonify({"status": "error", "message": "Previous recording is still being saved"}), 400
+        process = _recordings.get(patient_id)
+        if process is not None and process.poll() is None:
+            return jsonify({"status": "error", "message": "Recording already in progress"}), 400
+        
+        try:
+            # Start example.py with the patient ID and show output in terminal
+            _recordings[patient_id] = subprocess.Popen(
+                [sys.executable, RECORDING_SCRIPT, str(patient_id)],
+                # No stdin, so the recorder doesn't share the server's terminal and its
+                # stop-on-Enter watcher stays off
+                stdin=subprocess.DEVNULL,
+                # Remove stdout and stderr capture to show in terminal
+                bufsize=1,
+                universal_newlines=True
+            )
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 500
     
-    if recording_process:
-        return jsonify({"status": "error", "message": "Recording already in progress"}), 400
+    return jsonify({"status": "success", "message": "Recording started"})
+
+def _reap_recording(patient_id, process):
+    """Wait for a stopped recorder to exit, killing it if it overruns, then unregister it."""
+    try:
+        process.wait(timeout=RECORDER_STOP_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        print(f"Recorder for patient {patient_id} did not exit after {RECORDER_STOP_TIMEOUT}s, killing it")
+        process.kill()
+        process.wait()
+    finally:
+        with _rec_lock:
+            if _recordings.get(patient_id) is process:
+                del _recordings[patient_id]
+            _stopping.discard(patient_id)
+
+@app.route('/stop_recording/<int:patient_id>', methods=['POST'])
+def stop_recording(patient_id):
+    with _rec_lock:
+        process = _recordings.get(patient_id)
+        if process is None or patient_id in _stopping:
+            return jsonify({"status": "error", "message": "No recording in progress"}), 400
+        _stopping.add(patient_id)
     
     try:
-        # Start example.py with the patient ID and show output in terminal
-        recording_process = subprocess.Popen(
-            ['python', '../audio/example.py', str(patient_id)],
-            # Remove stdout and stderr capture to show in terminal
-            bufsize=1,
-            universal_newlines=True
-        )
+        # SIGTERM asks the recorder to finish and save what it has
+        process.terminate()
         
-        return jsonify({"status": "success", "message": "Recording started"})
+        # Reap the process in the background; it keeps running while it analyzes the
+        # transcript, and the request shouldn't block on that
+        threading.Thread(target=_reap_recording, args=(patient_id, process), daemon=True).start()
+        return jsonify({"status": "success", "message": "Recording stopped"})
     except Exception as e:
+        print(f"Error stopping recording: {e}")
+        traceback.print_exc()
+        with _rec_lock:
+            _stopping.discard(patient_id)
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route('/stop_recording', methods=['POST'])
-def stop_recording():
-    global recording_process
-    
-    if recording_process:
-        try:
-            # Send SIGUSR1 for graceful stop
-            if os.name == 'nt':  # Windows
-                os.kill(recording_process.pid, signal.SIGTERM)
-            else:  # Unix/Linux/MacOS
-                os.kill(recording_process.pid, signal.SIGUSR1)
-                
-            # Wait briefly for process to clean up
-            recording_process.wait(timeout=2)
-            recording_process = None
-            return jsonify({"status": "success", "message": "Recording stopped"})
-        except Exception as e:
-            print(f"Error stopping recording: {e}")
-            traceback.print_exc()
-            recording_process = None
-            return jsonify({"status": "error", "message": str(e)}), 500
-    else:
-        return jsonify({"status": "error", "message": "No recording in progress"}), 400
-
-@app.route('/check_recording_status')
-def check_recording_status():
-    global recording_process
-    
-    if recording_process:
+@app.route('/check_recording_status/<int:patient_id>')
+def check_recording_status(patient_id):
+    with _rec_lock:
+        process = _recordings.get(patient_id)
+        if process is None:
+            return jsonify({"is_recording": False})
+        
+        # Stopped, but still saving its outputs
+        if patient_id in _stopping:
+            return jsonify({"is_recording": False, "stopping": True})
+        
         # Check if process is still running
-        return_code = recording_process.poll()
-        if return_code is None:
-            # Process is still running
+        if process.poll() is None:
             return jsonify({"is_recording": True})
-        else:
-            # Process has ended
-            recording_process = None  # Clear the process
-            return jsonify({"is_recording": False})
-    else:
-        return jsonify({"is_recording": False})
+        
+        # Process has ended
+        del _recordings[patient_id]
+    return jsonify({"is_recording": False})
 
 @app.route('/get_patient_data/<int:patient_id>')
 def get_patient_data(patient_id):
@@ -441,7 +507,7 @@ def get_patient_data(patient_id):
 
 @app.route('/create_new_patient', methods=['POST'])
 def create_new_patient():
-    conn = sqlite3.connect('../audio/medical_records.db')
+    conn = get_conn()
     cursor = conn.cursor()
     
     try:
@@ -469,9 +535,8 @@ def create_new_patient():
         
     except sqlite3.Error as e:
         print(f"Database error: {e}")
+        conn.rollback()
         return render_template('login.html', error="Failed to create new patient")
-    finally:
-        conn.close()
 
 @app.route('/summary_report/<int:patient_id>')
 def summary_report(patient_id):
@@ -485,14 +550,11 @@ def summary_report(patient_id):
 def generate_report(patient_id):
     """Generate a medical report for the specified patient."""
     try:
-        # Get patient data
-        patient_data = get_patient_record(patient_id)
+        # Get patient data and the latest transcript together
+        patient_data, transcript_data = get_report_data(patient_id)
         if not patient_data:
             print(f"Patient not found: {patient_id}")
             return jsonify({"error": "Patient not found"}), 404
-
-        # Get transcript data
-        transcript_data = get_patient_transcript(patient_id)
         print(f"Transcript data: {transcript_data}")
         
         # Generate the report
@@ -506,6 +568,78 @@ def generate_report(patient_id):
         traceback.print_exc()
         return jsonify({"error": f"Failed to generate report: {str(e)}"}), 500
 
+# PDF rendering runs in worker processes, so a long render doesn't hold a request thread
+PDF_WORKERS = 2
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+def get_pdf_pool():
+    """Return the PDF worker pool, starting it on first use."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # Spawn fresh workers; forking this multi-threaded server could hand a worker
+            # locks that other request threads were holding
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'))
+    return _pdf_pool
+
+def render_pdf_file(html_content, report_style=False):
+    """
+    Render HTML to a temporary PDF file in the worker pool.
+    
+    If a worker died and broke the pool, the pool is replaced and the render retried once.
+    
+    Returns:
+        Path of the rendered PDF; send_pdf_file removes it when sending it
+    """
+    global _pdf_pool
+    pool = get_pdf_pool()
+    try:
+        return pool.submit(render_pdf, html_content, report_style).result()
+    except BrokenProcessPool:
+        print("PDF worker pool broke, restarting it")
+        with _pdf_pool_lock:
+            # Another thread may already have replaced it
+            if _pdf_pool is pool:
+                _pdf_pool = None
+        pool.shutdown(wait=False)
+        return get_pdf_pool().submit(render_pdf, html_content, report_style).result()
+
+def send_pdf_file(path, download_name, etag=None):
+    """
+    Stream a rendered PDF file as a download, deleting it from disk first.
+
+    The file is unlinked as soon as it is open, so no patient PDF is left behind however
+    the response ends; the open handle keeps it readable until the server closes it.
+    """
+    try:
+        pdf_file = open(path, 'rb')
+    finally:
+        os.remove(path)
+
+    try:
+        size = os.fstat(pdf_file.fileno()).st_size
+        response = send_file(
+            pdf_file,
+            as_attachment=True,
+            download_name=download_name,
+            mimetype='application/pdf',
+            etag=etag if etag is not None else False,
+            conditional=True  # Honor conditional request headers
+        )
+    except Exception:
+        pdf_file.close()
+        raise
+
+    # send_file can't size an open file, so set the length it would have read from the path
+    if response.status_code == 200:
+        response.content_length = size
+    return response
+
+# Report markup, compiled once by Jinja at startup
+REPORT_TEMPLATE = app.jinja_env.get_template('report.html')
+
 def generate_report_html(patient_data, transcript_data):
     """Generate an HTML version of the medical report."""
     try:
@@ -514,145 +648,9 @@ def generate_report_html(patient_data, transcript_data):
 
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        # Create HTML report with styling
-        html_content = f"""
-        <html>
-        <head>
-            <style>
-                body {{
-                    font-family: Arial, sans-serif;
-                    line-height: 1.6;
-                    margin: 40px;
-                }}
-                h1 {{
-                    color: #2c3e50;
-                    border-bottom: 2px solid #3498db;
-                    padding-bottom: 10px;
-                }}
-                h2 {{
-                    color: #2980b9;
-                    margin-top: 20px;
-                }}
-                .section {{
-                    margin: 20px 0;
-                    padding: 10px;
-                    background-color: #f9f9f9;
-                    border-radius: 5px;
-                }}
-                .header {{
-                    text-align: center;
-                    margin-bottom: 30px;
-                }}
-                .timestamp {{
-                    color: #7f8c8d;
-                    font-size: 0.9em;
-                    text-align: right;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>MEDICAL REPORT</h1>
-                <div class="timestamp">Generated on: {current_time}</div>
-            </div>
-            
-            <div class="section">
-                <h2>PATIENT INFORMATION</h2>
-                <p>Name: {patient_data.get('first_name', 'N/A')} {patient_data.get('last_name', 'N/A')}</p>
-                <p>ID: {patient_data.get('id', 'N/A')}</p>
-                <p>Age: {patient_data.get('age', 'N/A')}</p>
-                <p>Date of Birth: {patient_data.get('date_of_birth', 'N/A')}</p>
-                <p>Gender: {patient_data.get('gender', 'N/A')}</p>
-            </div>
-        """
-        
-        if patient_data.get('medical_history'):
-            html_content += f"""
-            <div class="section">
-                <h2>MEDICAL HISTORY</h2>
-                <p>{patient_data.get('medical_history')}</p>
-            </div>
-            """
-        
-        if patient_data.get('medications'):
-            html_content += f"""
-            <div class="section">
-                <h2>CURRENT MEDICATIONS</h2>
-                <p>{patient_data.get('medications')}</p>
-            </div>
-            """
-        
-        if patient_data.get('allergies'):
-            html_content += f"""
-            <div class="section">
-                <h2>ALLERGIES</h2>
-                <p>{patient_data.get('allergies')}</p>
-            </div>
-            """
-        
-        if patient_data.get('vital_signs'):
-            html_content += f"""
-            <div class="section">
-                <h2>VITAL SIGNS</h2>
-                <p>{patient_data.get('vital_signs')}</p>
-            </div>
-            """
-        
-        if patient_data.get('symptoms'):
-            html_content += f"""
-            <div class="section">
-                <h2>CURRENT SYMPTOMS</h2>
-                <p>{patient_data.get('symptoms')}</p>
-            </div>
-            """
-        
-        if patient_data.get('diagnosis'):
-            html_content += f"""
-            <div class="section">
-                <h2>DIAGNOSIS</h2>
-                <p>{patient_data.get('diagnosis')}</p>
-            </div>
-            """
-        
-        if patient_data.get('treatment_plan'):
-            html_content += f"""
-            <div class="section">
-                <h2>TREATMENT PLAN</h2>
-                <p>{patient_data.get('treatment_plan')}</p>
-            </div>
-            """
-
-        if transcript_data and transcript_data.get('transcript'):
-            html_content += f"""
-            <div class="section">
-                <h2>VISIT TRANSCRIPT</h2>
-                <p>Recorded on: {transcript_data.get('timestamp', 'Date not recorded')}</p>
-                <p>{transcript_data.get('transcript')}</p>
-            </div>
-            """
-
-        if patient_data.get('notes'):
-            html_content += f"""
-            <div class="section">
-                <h2>IMPORTANT NOTES</h2>
-                <p>{patient_data.get('notes')}</p>
-            </div>
-            """
-
-        if patient_data.get('follow_up_date'):
-            html_content += f"""
-            <div class="section">
-                <h2>FOLLOW-UP</h2>
-                <p>Next appointment: {patient_data.get('follow_up_date')}</p>
-            </div>
-            """
-
-        html_content += """
-        </body>
-        </html>
-        """
-        
-        return html_content
+        # Render the precompiled report template
+        return REPORT_TEMPLATE.render(patient=patient_data, transcript=transcript_data,
+                                      sections=REPORT_SECTIONS, current_time=current_time)
     except Exception as e:
         print(f"Error in generate_report_html: {e}")
         traceback.print_exc()
@@ -662,148 +660,196 @@ def generate_report_html(patient_data, transcript_data):
 def download_report(patient_id):
     """Generate and download a PDF version of the medical report."""
     try:
-        # Get patient data
-        patient_data = get_patient_record(patient_id)
+        # Get patient data and the latest transcript together
+        patient_data, transcript_data = get_report_data(patient_id)
         if not patient_data:
             return "Patient not found", 404
-
-        # Get transcript data
-        transcript_data = get_patient_transcript(patient_id)
+        
+        # The report only changes with the patient record and latest transcript, so their
+        # contents identify it; a client that already has this version gets a 304 without a render
+        etag = hashlib.sha1(orjson.dumps([patient_data, transcript_data], option=orjson.OPT_SORT_KEYS)).hexdigest()
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
         
         # Generate HTML report
         html_content = generate_report_html(patient_data, transcript_data)
         
-        # Generate PDF from HTML
-        pdf = HTML(string=html_content).write_pdf()
-        
-        # Create a BytesIO object
-        pdf_buffer = io.BytesIO(pdf)
-        pdf_buffer.seek(0)
+        # Render in a worker process with the report stylesheet; this thread just waits
+        pdf_path = render_pdf_file(html_content, report_style=True)
         
         # Generate filename for download
         filename = f"medical_report_{patient_data['first_name']}_{patient_data['last_name']}_{datetime.now().strftime('%Y%m%d')}.pdf"
         
-        return send_file(
-            pdf_buffer,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/pdf'
-        )
+        # Stream the file from disk rather than holding the PDF in memory
+        return send_pdf_file(pdf_path, filename, etag=etag)
     
     except Exception as e:
         print(f"Error generating PDF: {e}")
         traceback.print_exc()
         return f"Error generating PDF: {str(e)}", 500
 
-def analyze_transcript(transcript_text):
-    """Analyze the transcript text to extract key points and important information."""
-    try:
-        # Try to find and read the corresponding analysis file
-        output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                                'audio', 'output')
-        analysis_files = [f for f in os.listdir(output_dir) 
-                       if f.startswith('analysis_') and f.endswith('.json')]
-        
-        if analysis_files:
-            # Get the most recent analysis file
-            latest_file = max(analysis_files, key=lambda x: os.path.getctime(os.path.join(output_dir, x)))
-            with open(os.path.join(output_dir, latest_file), 'r') as f:
-                analysis_data = json.load(f)
-                
-                # Extract the key points from the analysis
-                if 'extracted_information' in analysis_data:
-                    info = analysis_data['extracted_information']
-                    key_points = []
-                    
-                    # Convert the extracted information into key points
-                    for category, value in info.items():
-                        if value and value != "null":
-                            key_points.append({
-                                'category': category.replace('_', ' ').title(),
-                                'text': str(value)
-                            })
-                    
-                    return {
-                        'key_points': key_points,
-                        'timestamp': analysis_data.get('timestamp', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-                    }
-        
-        # Fallback to basic keyword analysis if no analysis file found
-        key_points = []
-        sentences = transcript_text.split('.')
-        
-        keywords = {
-            'symptoms': ['pain', 'discomfort', 'feeling', 'experiencing', 'complains'],
-            'medications': ['prescribed', 'taking', 'medication', 'drug', 'dose'],
-            'diagnoses': ['diagnosed', 'diagnosis', 'condition', 'assessment'],
-            'vitals': ['blood pressure', 'temperature', 'heart rate', 'pulse'],
-            'treatments': ['treatment', 'therapy', 'procedure', 'recommended'],
-            'follow_up': ['follow up', 'next visit', 'schedule', 'return']
-        }
-        
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if not sentence:
-                continue
+# Keywords that mark a transcript sentence as a key point, by category
+TRANSCRIPT_KEYWORDS = {
+    'symptoms': ['pain', 'discomfort', 'feeling', 'experiencing', 'complains'],
+    'medications': ['prescribed', 'taking', 'medication', 'drug', 'dose'],
+    'diagnoses': ['diagnosed', 'diagnosis', 'condition', 'assessment'],
+    'vitals': ['blood pressure', 'temperature', 'heart rate', 'pulse'],
+    'treatments': ['treatment', 'therapy', 'procedure', 'recommended'],
+    'follow_up': ['follow up', 'next visit', 'schedule', 'return']
+}
+
+# All keywords in one case-insensitive pattern with a named group per category, so each match
+# reports its category as lastgroup; keywords only match as whole words, so "pain" skips "painter"
+KEYWORD_PATTERN = re.compile(
+    r'\b(?:' + '|'.join(f'(?P<{category}>' + '|'.join(map(re.escape, words)) + ')'
+                         for category, words in TRANSCRIPT_KEYWORDS.items()) + r')\b',
+    re.IGNORECASE)
+SENTENCE_END_PATTERN = re.compile(r'\.')
+
+@lru_cache(maxsize=512)
+def _analyze_cached(transcript_text, analysis_path):
+    """
+    Build the analysis for a transcript from an analysis file or its keywords.
+    
+    Cached by transcript text and analysis file; analysis files are named by recording
+    time, so a new recording changes the key instead of needing the cache cleared.
+    Callers share the returned dict and must not modify it.
+    """
+    if analysis_path:
+        with open(analysis_path, 'rb') as f:
+            analysis_data = orjson.loads(f.read())
             
-            for category, words in keywords.items():
-                if any(word.lower() in sentence.lower() for word in words):
-                    key_points.append({
-                        'category': category.capitalize(),
-                        'text': sentence
-                    })
-        
-        return {
-            'key_points': key_points,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
+            # Extract the key points from the analysis
+            if 'extracted_information' in analysis_data:
+                info = analysis_data['extracted_information']
+                key_points = []
+                
+                # Convert the extracted information into key points
+                for category, value in info.items():
+                    if value and value != "null":
+                        key_points.append({
+                            'category': category.replace('_', ' ').title(),
+                            'text': str(value)
+                        })
+                
+                return {
+                    'key_points': key_points,
+                    'timestamp': analysis_data.get('timestamp', datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                }
+    
+    # Fallback to basic keyword analysis if no analysis file found
+    key_points = []
+    sentences = transcript_text.split('.')
+    
+    # One scan finds every keyword; each hit belongs to the sentence
+    # ending at the first period after it
+    periods = [match.start() for match in SENTENCE_END_PATTERN.finditer(transcript_text)]
+    hits = {}
+    for match in KEYWORD_PATTERN.finditer(transcript_text):
+        index = bisect_left(periods, match.start())
+        hits.setdefault(index, set()).add(match.lastgroup)
+    
+    for index in sorted(hits):
+        sentence = sentences[index].strip()
+        categories = hits[index]
+        for category in TRANSCRIPT_KEYWORDS:
+            if category in categories:
+                key_points.append({
+                    'category': category.capitalize(),
+                    'text': sentence
+                })
+    
+    return {
+        'key_points': key_points,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+# analysis_path for a transcript with no analysis file, which gets keyword analysis
+NO_ANALYSIS_FILE = ''
+
+def analyze_transcript(transcript_text, analysis_path=NO_ANALYSIS_FILE):
+    """
+    Analyze the transcript text to extract key points and important information.
+    
+    Args:
+        transcript_text: Transcribed visit text
+        analysis_path: Analysis file written for this transcript; NO_ANALYSIS_FILE
+            uses keyword analysis
+    """
+    try:
+        return _analyze_cached(transcript_text, analysis_path)
     except Exception as e:
         print(f"Error analyzing transcript: {e}")
         traceback.print_exc()
         return None
 
+# Threads generating missing transcript analyses on the history page
+ANALYSIS_WORKERS = 8
+
+def analysis_files_by_transcript():
+    """Map each transcription in the output directory to the analysis file written for it."""
+    files = {}
+    try:
+        with os.scandir(OUTPUT_DIR) as entries:
+            for entry in entries:
+                name = entry.name
+                if not (name.startswith('analysis_') and name.endswith('.json')):
+                    continue
+                try:
+                    with open(entry.path, 'rb') as f:
+                        text = orjson.loads(f.read()).get('transcription')
+                except (OSError, orjson.JSONDecodeError):
+                    continue
+                if text:
+                    files[text] = entry.path
+    except OSError as e:
+        print(f"Error scanning analysis files: {e}")
+    return files
+
 def get_all_patient_transcripts(patient_id):
     """Get all transcripts for a patient with their analyses."""
     try:
-        conn = sqlite3.connect('../audio/medical_records.db')
+        conn = get_conn()
         cursor = conn.cursor()
         
-        # Create transcripts table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transcripts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                patient_id INTEGER,
-                transcript TEXT,
-                analysis TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (patient_id) REFERENCES patient_records (id)
-            )
-        ''')
-        conn.commit()
-        
         # Get all transcripts for the patient
-        cursor.execute('''
-            SELECT transcript, analysis, timestamp 
-            FROM transcripts 
-            WHERE patient_id = ? 
-            ORDER BY timestamp DESC
-        ''', (patient_id,))
+        cursor.execute(SQL_GET_PATIENT_TRANSCRIPTS, (patient_id,))
+        
+        rows = cursor.fetchall()
+        
+        # The recorder stores each transcript with its analysis; rows without one are analyzed here,
+        # in parallel since each may read the analysis file the recorder wrote for it, with keyword
+        # analysis when there is none
+        missing = [row for row in rows if row['key_points'] is None]
+        new_analyses = {}
+        if missing:
+            analysis_files = analysis_files_by_transcript()
+            with ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS) as executor:
+                results = executor.map(
+                    lambda row: analyze_transcript(row['transcript'], analysis_files.get(row['transcript'], NO_ANALYSIS_FILE)),
+                    missing)
+                new_analyses = {row['id']: analysis for row, analysis in zip(missing, results)}
         
         transcripts = []
-        for row in cursor.fetchall():
-            transcript_text, analysis_json, timestamp = row
+        # Analyses computed here, written back so later visits read them from the row
+        computed = []
+        for row in rows:
+            transcript_id, transcript_text, timestamp, key_points_json, analysis_ts = row
             
-            # Parse the analysis JSON if it exists
+            # Parse the key points SQLite pulled out of the stored analysis, if there is one
             try:
-                if analysis_json:
-                    analysis = json.loads(analysis_json)
+                if key_points_json is not None:
+                    analysis = {'key_points': orjson.loads(key_points_json), 'timestamp': analysis_ts}
                 else:
-                    # Generate new analysis if none exists
-                    analysis = analyze_transcript(transcript_text)
+                    analysis = new_analyses[transcript_id]
+                    if analysis is not None:
+                        computed.append((orjson.dumps(analysis).decode(), transcript_id))
                 
                 if analysis is None:
                     analysis = {'key_points': []}
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 print(f"Error decoding analysis JSON: {e}")
                 analysis = {'key_points': []}
             except Exception as e:
@@ -816,7 +862,17 @@ def get_all_patient_transcripts(patient_id):
                 'timestamp': timestamp
             })
         
-        conn.close()
+        # Store the new analyses in one transaction
+        if computed:
+            # A failed write, including a busy database, only skips storing them
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.executemany(SQL_SET_TRANSCRIPT_ANALYSIS, computed)
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error saving transcript analyses: {e}")
+                conn.rollback()
+        
         print(f"Retrieved {len(transcripts)} transcripts for patient {patient_id}")  # Debug print
         return transcripts
     except Exception as e:
@@ -831,25 +887,8 @@ def transcript(patient_id):
     if not patient:
         return redirect(url_for('index'))
     
-    # Get files from database for this patient
-    conn = sqlite3.connect('../audio/medical_records.db')
-    cursor = conn.cursor()
-    
-    # Create output_files table if it doesn't exist
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS output_files (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patient_id INTEGER,
-            filename TEXT,
-            file_type TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (patient_id) REFERENCES patient_records (id)
-        )
-    ''')
-    conn.commit()
-    
     # Get all files for this patient
-    cursor.execute('''
+    cursor = get_conn().execute('''
         SELECT filename, file_type, created_at 
         FROM output_files 
         WHERE patient_id = ? 
@@ -857,7 +896,6 @@ def transcript(patient_id):
     ''', (patient_id,))
     
     output_files = cursor.fetchall()
-    conn.close()
     
     # Organize files by type
     transcripts = []
@@ -873,6 +911,9 @@ def transcript(patient_id):
                          transcripts=transcripts,
                          analyses=analyses)
 
+# Transcript export markup, compiled once by Jinja at startup
+EXPORT_TEMPLATE = app.jinja_env.get_template('export_transcripts.html')
+
 @app.route('/export_transcripts/<int:patient_id>')
 def export_transcripts(patient_id):
     """Export all transcripts as a PDF."""
@@ -883,97 +924,15 @@ def export_transcripts(patient_id):
             
         transcripts = get_all_patient_transcripts(patient_id)
         
-        # Generate HTML for the transcripts
-        html_content = f"""
-        <html>
-        <head>
-            <style>
-                body {{
-                    font-family: Arial, sans-serif;
-                    line-height: 1.6;
-                    margin: 40px;
-                }}
-                h1 {{
-                    color: #2c3e50;
-                    border-bottom: 2px solid #3498db;
-                    padding-bottom: 10px;
-                }}
-                .transcript-entry {{
-                    margin-bottom: 30px;
-                    padding: 20px;
-                    background-color: #f9f9f9;
-                    border-radius: 8px;
-                    border-left: 4px solid #40B3A2;
-                }}
-                .transcript-header {{
-                    margin-bottom: 15px;
-                    padding-bottom: 10px;
-                    border-bottom: 1px solid #eee;
-                }}
-                .timestamp {{
-                    color: #666;
-                    font-size: 0.9em;
-                }}
-                .analysis-section {{
-                    background-color: #f0f7f6;
-                    padding: 15px;
-                    margin-top: 15px;
-                    border-radius: 5px;
-                }}
-            </style>
-        </head>
-        <body>
-            <h1>Transcripts - {patient['first_name']} {patient['last_name']}</h1>
-            <div class="patient-info">
-                <p>ID: {patient['id']}</p>
-                <p>DOB: {patient['date_of_birth']}</p>
-                <p>Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-            </div>
-        """
-        
-        for transcript in transcripts:
-            html_content += f"""
-            <div class="transcript-entry">
-                <div class="transcript-header">
-                    <h2>Visit Record</h2>
-                    <span class="timestamp">{transcript['timestamp']}</span>
-                </div>
-                <div class="transcript-content">
-                    {transcript['transcript']}
-                </div>
-            """
-            
-            if transcript['analysis'] and transcript['analysis']['key_points']:
-                html_content += """
-                <div class="analysis-section">
-                    <h3>AI Analysis</h3>
-                    <ul>
-                """
-                for point in transcript['analysis']['key_points']:
-                    html_content += f"""
-                    <li><strong>{point['category']}:</strong> {point['text']}</li>
-                    """
-                html_content += """
-                    </ul>
-                </div>
-                """
-            
-            html_content += "</div>"
-        
-        html_content += """
-        </body>
-        </html>
-        """
+        # Generate HTML for the transcripts from the precompiled template
+        html_content = EXPORT_TEMPLATE.render(patient=patient, transcripts=transcripts,
+                                              current_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
         
         # Generate PDF
-        pdf = HTML(string=html_content).write_pdf()
-        
-        # Create response
-        response = make_response(pdf)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename=transcripts_{patient["first_name"]}_{patient["last_name"]}.pdf'
+        pdf_path = render_pdf_file(html_content)
         
-        return response
+        # Stream the file from disk rather than holding the PDF in memory
+        return send_pdf_file(pdf_path, f'transcripts_{patient["first_name"]}_{patient["last_name"]}.pdf')
         
     except Exception as e:
         print(f"Error exporting transcripts: {e}")
@@ -983,8 +942,7 @@ def export_transcripts(patient_id):
 @app.route('/serve_file/<path:filename>')
 def serve_file(filename):
     """Serve a file from the output directory."""
-    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
-    return send_from_directory(output_dir, filename)
+    return send_from_directory(OUTPUT_DIR, filename)
 
 @app.route('/forms/<int:patient_id>')
 def forms(patient_id):
@@ -995,21 +953,14 @@ def forms(patient_id):
 
 @app.route('/ai_assistant/<int:patient_id>')
 def ai_assistant(patient_id):
-    conn = sqlite3.connect('../audio/medical_records.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM patient_records WHERE id = ?', (patient_id,))
-    patient_record = cursor.fetchone()
+    row = get_conn().execute(SQL_GET_PATIENT_RECORD, (patient_id,)).fetchone()
     
-    if patient_record is None:
-        conn.close()
+    if row is None:
         return "Patient not found", 404
     
-    # Get column names
-    columns = [description[0] for description in cursor.description]
-    # Convert to dictionary
-    patient = dict(zip(columns, patient_record))
+    # Rows are mappings, so the record converts straight to a dictionary
+    patient = dict(row)
     
-    conn.close()
     return render_template('ai_assistant.html', patient=patient)
 
 @app.route('/chat', methods=['POST'])
@@ -1024,10 +975,20 @@ def chat():
         if not message or not patient_id or not patient_context:
             return jsonify({"error": "Missing required parameters"}), 400
         
-        # Send message to chat service with patient context
-        response = chat_service.send_message(message, patient_context)
+        # Stream the reply as server-sent events while the model generates it; each event
+        # carries a JSON object so newlines in the text can't break the event framing
+        def events():
+            try:
+                for delta in chat_service.stream_message(message, patient_context):
+                    yield b'data: ' + orjson.dumps({"delta": delta}) + b'\n\n'
+            except Exception as e:
+                print(f"Error streaming chat response: {e}")
+                traceback.print_exc()
+                yield b'data: ' + orjson.dumps({"error": "Internal server error"}) + b'\n\n'
+            yield b'data: ' + orjson.dumps({"done": True}) + b'\n\n'
         
-        return jsonify({"response": response})
+        return Response(events(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
         
     except Exception as e:
         print(f"Error in chat endpoint: {e}")
@@ -1,76 +1,155 @@
 import os
+import json
+import hashlib
+from collections import deque, defaultdict
+from cachetools import LRUCache
 from groq import Groq
 
+# Recent user/assistant exchanges sent with each message; older turns are dropped
+MAX_HISTORY_TURNS = 8
+
+# Patient context sent to the model; fields missing from the context read as None
+CONTEXT_TEMPLATE = """Current patient information:
+Name: {first_name} {last_name}
+Age: {age}
+Gender: {gender}
+Current Symptoms: {symptoms}
+Vital Signs: {vital_signs}
+Medications: {medications}
+Allergies: {allergies}
+Medical History: {medical_history}
+Family History: {family_history}
+Current Diagnosis: {diagnosis}
+Treatment Plan: {treatment_plan}
+Notes: {notes}
+Date of Birth: {date_of_birth}"""
+
+# Replies remembered for identical conversations, so a repeated question skips the API call
+RESPONSE_CACHE_SIZE = 256
+
 class ChatService:
     def __init__(self):
         self.client = Groq(api_key=os.getenv('GROQ_API_KEY'))
-        self.conversation_history = [
-            {
-                "role": "system",
-                "content": """You are an AI medical assistant helping healthcare professionals. 
-                You have access to patient records and can help answer questions about the patient's 
-                medical history, current condition, and treatment plans. Always maintain a professional 
-                and clinical tone, and be sure to reference relevant patient information as much as possible."""
-            }
-        ]
+        self._system = {
+            "role": "system",
+            "content": """You are an AI medical assistant helping healthcare professionals. 
+            You have access to patient records and can help answer questions about the patient's 
+            medical history, current condition, and treatment plans. Always maintain a professional 
+            and clinical tone, and be sure to reference relevant patient information as much as possible."""
+        }
+        # The latest patient context replaces the previous one instead of piling up
+        self._context_msg = None
+        self._context_key = None
+        # Bounded so each request stays the same size however long the session runs
+        self._turns = deque(maxlen=2 * MAX_HISTORY_TURNS)
+        self._cache = LRUCache(maxsize=RESPONSE_CACHE_SIZE)
 
-    def send_message(self, message, patient_context=None):
-        try:
-            # Debugging: Print patient context
-            print("Patient Context:", patient_context)
-            
-            # Debugging: Print date of birth
-            print("Date of Birth:", patient_context.get('date_of_birth'))
-            
-            # If patient context is provided, add it to the message
-            if patient_context:
-                context_message = {
+    def _prepare(self, message, patient_context):
+        """
+        Build the request for a new user message.
+        
+        Returns:
+            Tuple of (user message, full message list to send, response cache key)
+        """
+        # Debugging: Print patient context
+        print("Patient Context:", patient_context)
+        
+        # Debugging: Print date of birth
+        print("Date of Birth:", patient_context.get('date_of_birth'))
+        
+        # If patient context is provided, add it to the message; the message is only
+        # rebuilt when the context differs from the last one
+        if patient_context:
+            context_key = tuple(sorted(patient_context.items()))
+            if context_key != self._context_key:
+                self._context_key = context_key
+                self._context_msg = {
                     "role": "system",
-                    "content": f"""Current patient information:
-                    Name: {patient_context.get('first_name')} {patient_context.get('last_name')}
-                    Age: {patient_context.get('age')}
-                    Gender: {patient_context.get('gender')}
-                    Current Symptoms: {patient_context.get('symptoms')}
-                    Vital Signs: {patient_context.get('vital_signs')}
-                    Medications: {patient_context.get('medications')}
-                    Allergies: {patient_context.get('allergies')}
-                    Medical History: {patient_context.get('medical_history')}
-                    Family History: {patient_context.get('family_history')}
-                    Current Diagnosis: {patient_context.get('diagnosis')}
-                    Treatment Plan: {patient_context.get('treatment_plan')}
-                    Notes: {patient_context.get('notes')}
-                    Date of Birth: {patient_context.get('date_of_birth')}"""
+                    "content": CONTEXT_TEMPLATE.format_map(defaultdict(lambda: None, patient_context))
                 }
-                self.conversation_history.append(context_message)
 
-            # Add user message to history
-            self.conversation_history.append({
-                "role": "user",
-                "content": message
+        user_message = {
+            "role": "user",
+            "content": message
+        }
+        messages = [self._system]
+        if self._context_msg:
+            messages.append(self._context_msg)
+        messages.extend(self._turns)
+        messages.append(user_message)
+
+        key = hashlib.blake2b(json.dumps(messages, sort_keys=True).encode(), digest_size=16).digest()
+        return user_message, messages, key
+
+    def _remember(self, user_message, content, key):
+        """Cache a reply and add the exchange to history."""
+        if content:
+            self._cache[key] = content
+            self._turns.append(user_message)
+            self._turns.append({
+                "role": "assistant",
+                "content": content
             })
 
-            # Get completion from Groq API
-            completion = self.client.chat.completions.create(
-                messages=self.conversation_history,
+    def send_message(self, message, patient_context=None):
+        try:
+            user_message, messages, key = self._prepare(message, patient_context)
+
+            # Reuse the reply to an identical conversation, otherwise get a completion from Groq API
+            content = self._cache.get(key)
+            if content is None:
+                completion = self.client.chat.completions.create(
+                    messages=messages,
+                    model="llama-3.3-70b-versatile",
+                    temperature=0.5
+                )
+                content = completion.choices[0].message.content
+
+            # Add the exchange to history
+            self._remember(user_message, content, key)
+
+            return content
+
+        except Exception as e:
+            print(f"Error in chat service: {e}")
+            raise e
+
+    def stream_message(self, message, patient_context=None):
+        """
+        Send a message and yield the reply in pieces as Groq generates it.
+        
+        The exchange is added to history once the whole reply has arrived.
+        """
+        try:
+            user_message, messages, key = self._prepare(message, patient_context)
+
+            # A cached reply is sent whole
+            content = self._cache.get(key)
+            if content is not None:
+                self._remember(user_message, content, key)
+                yield content
+                return
+
+            stream = self.client.chat.completions.create(
+                messages=messages,
                 model="llama-3.3-70b-versatile",
-                temperature=0.5
+                temperature=0.5,
+                stream=True
             )
+            parts = []
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield delta
 
-            # Add assistant's response to history
-            if completion.choices[0].message.content:
-                self.conversation_history.append({
-                    "role": "assistant",
-                    "content": completion.choices[0].message.content
-                })
-
-            return completion.choices[0].message.content
+            self._remember(user_message, "".join(parts), key)
 
         except Exception as e:
             print(f"Error in chat service: {e}")
             raise e
 
     def clear_history(self):
-        self.conversation_history = [{
-            "role": "system",
-            "content": "You are an AI medical assistant helping healthcare professionals."
-        }] 
\ No newline at end of file
+        self._context_msg = None
+        self._context_key = None
+        self._turns.clear() 
\ No newline at end of file
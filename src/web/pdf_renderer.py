@@ -0,0 +1,71 @@
+import os
+import tempfile
+from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
+
+# On-disk cache WeasyPrint reuses for decoded images across PDF renders
+PDF_CACHE_DIR = os.getenv('NURSE_PDF_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'nurse-agent-weasyprint'))
+os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+
+# Font lookup shared by every PDF render, so fonts are resolved once per process
+FONT_CONFIG = FontConfiguration()
+
+# Report stylesheet, parsed once and applied when the PDF is rendered
+REPORT_CSS = CSS(font_config=FONT_CONFIG, string='''
+    body {
+        font-family: Arial, sans-serif;
+        line-height: 1.6;
+        margin: 40px;
+    }
+    h1 {
+        color: #2c3e50;
+        border-bottom: 2px solid #3498db;
+        padding-bottom: 10px;
+    }
+    h2 {
+        color: #2980b9;
+        margin-top: 20px;
+    }
+    .section {
+        margin: 20px 0;
+        padding: 10px;
+        background-color: #f9f9f9;
+        border-radius: 5px;
+    }
+    .header {
+        text-align: center;
+        margin-bottom: 30px;
+    }
+    .timestamp {
+        color: #7f8c8d;
+        font-size: 0.9em;
+        text-align: right;
+    }
+''')
+
+def render_pdf(html_content, report_style=False):
+    """
+    Render HTML to a temporary PDF file.
+
+    Runs in the web app's PDF worker processes, so the module-level font
+    configuration and stylesheet are built once per worker. The PDF goes
+    straight to disk, so only its path travels back to the web app, which
+    removes the file as it sends it.
+
+    Args:
+        html_content: Complete HTML document to render
+        report_style: Apply the medical report stylesheet
+
+    Returns:
+        Path of the rendered PDF file
+    """
+    stylesheets = [REPORT_CSS] if report_style else None
+    fd, path = tempfile.mkstemp(suffix='.pdf', prefix='nurse-agent-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            HTML(string=html_content).write_pdf(target=f, stylesheets=stylesheets, font_config=FONT_CONFIG,
+                                                cache=PDF_CACHE_DIR)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
@@ -0,0 +1,25 @@
+import os
+import app as web_app
+
+PDF_BYTES = b'%PDF-1.4 test report'
+
+def test_report_download_removes_temp_pdf(monkeypatch, tmp_path):
+    """A downloaded report's temporary PDF must not be left on disk."""
+    pdf_path = tmp_path / 'nurse-agent-test.pdf'
+
+    def fake_render(html_content, report_style=False):
+        pdf_path.write_bytes(PDF_BYTES)
+        return str(pdf_path)
+
+    patient = {'id': 1, 'first_name': 'John', 'last_name': 'Doe'}
+    monkeypatch.setattr(web_app, 'get_report_data', lambda patient_id: (patient, None))
+    monkeypatch.setattr(web_app, 'render_pdf_file', fake_render)
+
+    client = web_app.app.test_client()
+    response = client.get('/download_report/1')
+
+    assert response.status_code == 200
+    assert response.data == PDF_BYTES
+    assert response.headers['Content-Length'] == str(len(PDF_BYTES))
+    response.close()
+    assert not os.path.exists(pdf_path)
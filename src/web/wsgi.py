@@ -0,0 +1,15 @@
+"""
+WSGI entry point for serving the web app with a production server.
+
+Run from this directory:
+    gunicorn -w 1 -k gthread --threads 8 -b 0.0.0.0:8080 wsgi:app
+
+Use a single worker process with many threads: the active recording process and the
+chat history live in module state, so every request has to reach the same process.
+Threads still let slow PDF renders and dashboard requests run side by side, and each
+thread keeps its own SQLite connection, so reads run concurrently under WAL.
+"""
+from app import app, create_database
+
+# Make sure the tables exist before the first request is served
+create_database()